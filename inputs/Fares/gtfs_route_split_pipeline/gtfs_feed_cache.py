@@ -0,0 +1,277 @@
+#### Parsed GTFS table cache
+# Keeps each parsed GTFS table as one .npy file per column with tight dtypes
+# (ID and text columns as int32 category codes, HH:MM:SS times as int32 seconds,
+# numbers in the smallest integer type that holds them), keyed by a hash of the
+# source .txt file. Loading a table from the cache skips CSV parsing entirely, and
+# an entry is rebuilt automatically as soon as its .txt file changes.
+
+import os
+import json
+import shutil
+import hashlib
+
+import numpy as np
+import pandas as pd
+from gtfs_kit import constants as cs
+from gtfs_kit import shapes as shp
+from gtfs_kit.feed import Feed
+
+# Default cache location, inside the feed folder.
+CACHE_DIR_NAME = '.gtfs_cache'
+TIME_COLUMNS = {'arrival_time', 'departure_time', 'start_time', 'end_time'}
+# Read options used by gtfs_kit's read_feed, so cached tables equal what it parses.
+CSV_OPTIONS = {
+    'na_values': ['', ' ', 'nan', 'NaN', 'null'],
+    'keep_default_na': True,
+    'dtype_backend': 'numpy_nullable',
+    'encoding': 'utf-8-sig',
+}
+
+
+def _file_fingerprint(path, previous=None):
+    """
+    Identifies a file's content by size, modification time and a BLAKE2 hash,
+    reusing the previous hash when the size and mtime have not changed.
+    """
+    resolved_path = os.path.realpath(path)
+    stat = os.stat(resolved_path)
+    if (previous and previous.get('path') == resolved_path and previous.get('size') == stat.st_size
+            and previous.get('mtime_ns') == stat.st_mtime_ns):
+        return dict(previous)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(resolved_path, 'rb') as f:
+        for block in iter(lambda: f.read(8 * 1024 ** 2), b''):
+            digest.update(block)
+    return {'path': resolved_path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': digest.hexdigest()}
+
+
+def parse_table(path, table):
+    """Parses a GTFS text file the way gtfs_kit's read_feed does. Returns None if it has no rows."""
+    df = pd.read_csv(path, dtype=cs.DTYPES.get(table), **CSV_OPTIONS)
+    if df.empty:
+        return None
+    df.columns = [col.strip() for col in df.columns]
+    return df
+
+
+def _time_seconds(text):
+    """
+    Seconds after midnight of a GTFS time, HH:MM:SS or H:MM:SS (hours may exceed
+    23), or None if the text is not such a time.
+    """
+    parts = text.strip().split(':')
+    if (len(parts) != 3 or not all(part.isdigit() for part in parts)
+            or len(parts[1]) != 2 or len(parts[2]) != 2):
+        return None
+    hours, minutes, seconds = (int(part) for part in parts)
+    if minutes > 59 or seconds > 59:
+        return None
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def _smallest_int(values):
+    """Casts integer values to the smallest signed type that holds them."""
+    if not len(values):
+        return values.astype(np.int8)
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if values.min() >= info.min and values.max() <= info.max:
+            return values.astype(dtype)
+    return values
+
+
+class _Uncacheable(Exception):
+    """Raised for a column whose values cannot be stored without pickling."""
+
+
+def _encode_column(name, series):
+    """
+    Returns (column manifest entry, {suffix: array}) for one parsed column.
+    """
+    dtype = series.dtype
+    entry = {'name': name, 'dtype': str(dtype)}
+    if isinstance(dtype, np.dtype) and dtype.kind in 'biuf':
+        values = series.to_numpy()
+        entry['kind'] = 'numpy'
+        return entry, {'': _smallest_int(values) if dtype.kind in 'iu' else values}
+    if pd.api.types.is_extension_array_dtype(dtype) and (
+            pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype)):
+        mask = series.isna().to_numpy()
+        if pd.api.types.is_bool_dtype(dtype):
+            values = series.to_numpy(dtype=bool, na_value=False)
+        elif pd.api.types.is_integer_dtype(dtype):
+            values = _smallest_int(series.to_numpy(dtype=np.int64, na_value=0))
+        else:
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        entry['kind'] = 'masked'
+        return entry, {'': values, '.mask': mask}
+
+    codes, categories = pd.factorize(series, use_na_sentinel=True)
+    categories = np.asarray(categories, dtype=object)
+    if not all(isinstance(value, str) for value in categories):
+        raise _Uncacheable(name)
+    codes = codes.astype(np.int32)
+    if name in TIME_COLUMNS:
+        seconds = [_time_seconds(value) for value in categories]
+        if all(value is not None for value in seconds):
+            # Rows keep int32 codes into the distinct times, stored both as int32
+            # seconds and as their text, so "5:30:00" reads back unchanged.
+            entry['kind'] = 'time'
+            return entry, {'': codes, '.seconds': np.asarray(seconds, dtype=np.int32),
+                           '.categories': categories.astype(str)}
+    entry['kind'] = 'category'
+    return entry, {'': codes, '.categories': categories.astype(str)}
+
+
+def _decode_column(entry, arrays, compact):
+    """Rebuilds a column from its arrays, as parsed (or with compact dtypes)."""
+    kind = entry['kind']
+    if kind == 'numpy':
+        return pd.Series(arrays['']).astype(entry['dtype'])
+    if kind == 'masked':
+        series = pd.Series(arrays['']).astype(entry['dtype'])
+        series[arrays['.mask']] = pd.NA
+        return series
+    if kind == 'time' and compact:
+        codes = arrays['']
+        missing = codes < 0
+        # Missing times (code -1) are masked; a column without any time has no seconds to index.
+        seconds = arrays['.seconds'][np.where(missing, 0, codes)] if len(arrays['.seconds']) else \
+            np.zeros(len(codes), dtype=np.int32)
+        return pd.Series(pd.arrays.IntegerArray(seconds, missing))
+    categorical = pd.Categorical.from_codes(arrays[''], categories=arrays['.categories'].astype(object))
+    if compact:
+        return pd.Series(categorical)
+    return pd.Series(categorical).astype(entry['dtype'])
+
+
+class GTFSFeedCache:
+    """
+    Binary copies of parsed GTFS tables, one folder per table holding a
+    manifest.json (source fingerprint and column layout) and .npy column files.
+    """
+
+    MANIFEST_NAME = 'manifest.json'
+    VERSION = 2
+
+    def __init__(self, cache_dir):
+        self.cache_dir = str(cache_dir)
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_dir(self, gtfs_folder, table):
+        # Feeds sharing a cache folder are told apart by their resolved path.
+        folder_key = hashlib.blake2b(os.path.realpath(gtfs_folder).encode('utf-8'), digest_size=8).hexdigest()
+        return os.path.join(self.cache_dir, folder_key, table)
+
+    def _load_manifest(self, entry_dir):
+        try:
+            with open(os.path.join(entry_dir, self.MANIFEST_NAME), 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if manifest.get('version') == self.VERSION else None
+
+    def _read(self, entry_dir, manifest, compact):
+        columns = {}
+        for position, entry in enumerate(manifest['columns']):
+            arrays = {suffix: np.load(os.path.join(entry_dir, f"{position}{suffix}.npy"))
+                      for suffix in manifest['files'][position]}
+            columns[entry['name']] = _decode_column(entry, arrays, compact)
+        return pd.DataFrame(columns)
+
+    def _write(self, entry_dir, encoded, n_rows, fingerprint):
+        """Stores the encoded columns of a parsed table."""
+        tmp_dir = f"{entry_dir}.tmp{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for position, (_, arrays) in enumerate(encoded):
+            for suffix, values in arrays.items():
+                np.save(os.path.join(tmp_dir, f"{position}{suffix}.npy"), values, allow_pickle=False)
+        with open(os.path.join(tmp_dir, self.MANIFEST_NAME), 'w') as f:
+            json.dump({
+                'version': self.VERSION,
+                'source': fingerprint,
+                'n_rows': n_rows,
+                'columns': [entry for entry, _ in encoded],
+                'files': [list(arrays) for _, arrays in encoded],
+            }, f, indent=2)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+
+    def load_table(self, gtfs_folder, table, compact=False):
+        """
+        Returns a GTFS table of the feed folder, from the cache when its .txt file
+        is unchanged, else parsing it and refreshing the cache.
+
+        Args:
+            gtfs_folder (str): Folder holding the GTFS text files.
+            table (str): Table name, e.g. 'stop_times'.
+            compact (bool): Keep IDs and text as categoricals and times as
+                nullable int32 seconds after midnight, instead of the dtypes
+                gtfs_kit parses. A time column holding any value that is not
+                H:MM:SS or HH:MM:SS is kept as a categorical of its text instead.
+
+        Returns:
+            pd.DataFrame: The table, or None when the file is absent or has no rows.
+        """
+        path = os.path.join(gtfs_folder, f"{table}.txt")
+        if not os.path.isfile(path) or not os.path.getsize(path):
+            return None
+        entry_dir = self._entry_dir(gtfs_folder, table)
+        manifest = self._load_manifest(entry_dir)
+        fingerprint = _file_fingerprint(path, manifest['source'] if manifest else None)
+        if manifest and manifest['source']['hash'] == fingerprint['hash']:
+            try:
+                df = self._read(entry_dir, manifest, compact)
+                self.hits += 1
+                return df
+            except (OSError, ValueError, KeyError, IndexError):
+                pass
+        self.misses += 1
+        df = parse_table(path, table)
+        if df is None:
+            return None
+        try:
+            encoded = [_encode_column(name, df[name]) for name in df.columns]
+        except _Uncacheable:
+            # Values that would need pickling: use the parsed table without caching it.
+            return df
+        try:
+            self._write(entry_dir, encoded, len(df), fingerprint)
+        except OSError as e:
+            print(f"Warning: Could not write the GTFS cache {self.cache_dir}: {e}")
+        if compact:
+            return pd.DataFrame({entry['name']: _decode_column(entry, arrays, compact) for entry, arrays in encoded})
+        return df
+
+    def load_feed(self, gtfs_folder, dist_units=None):
+        """
+        Builds a gtfs_kit Feed of the folder like read_feed, with every table
+        loaded through the cache.
+        """
+        tables = {table: self.load_table(gtfs_folder, table) for table in cs.DTYPES}
+        if dist_units is None:
+            dist_units = shp.infer_dist_units(tables['shapes'])
+        return Feed(dist_units=dist_units, **tables)
+
+
+def default_cache_dir(gtfs_folder):
+    """The cache folder used for a feed when none is given: .gtfs_cache inside it."""
+    return os.path.join(gtfs_folder, CACHE_DIR_NAME)
+
+
+def read_feed_cached(gtfs_folder, dist_units=None, cache_dir=None):
+    """
+    Shared GTFS loader: reads a feed folder like gtfs_kit's read_feed, keeping
+    the parsed tables in a binary cache for the next load.
+    """
+    return GTFSFeedCache(cache_dir or default_cache_dir(gtfs_folder)).load_feed(gtfs_folder, dist_units)
+
+
+def read_gtfs_table(gtfs_folder, table, compact=True, cache_dir=None):
+    """
+    Shared GTFS loader for a single table (e.g. in the notebooks), compact by
+    default: categorical IDs and int32 seconds for times (see GTFSFeedCache.load_table).
+    """
+    return GTFSFeedCache(cache_dir or default_cache_dir(gtfs_folder)).load_table(gtfs_folder, table, compact)
@@ -1,97 +1,839 @@
-import sys
+import io
 import os
+import re
+import sys
 import json
-from gtfs_kit.feed import read_feed
+import time
+import ctypes
+import shutil
+import argparse
+import datetime
+import platform
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from gtfs_kit import constants as cs
+from gtfs_kit.feed import Feed, read_feed
+
+from gtfs_feed_cache import GTFSFeedCache, default_cache_dir
+
+try:
+    import resource
+except ImportError:  # Windows: peak memory is read through psapi instead.
+    resource = None
+
+# Tables restrict_to_routes leaves as they are.
+UNFILTERED_TABLES = ['fare_attributes', 'fare_rules', 'feed_info', 'attributions']
+# Large tables the streaming engine reads in chunks of this many rows.
+DEFAULT_CHUNK_ROWS = 500_000
+CONFIG_FILE_NAME = 'Process_GTFS_Filter.json'
+# Tables a feed needs to be split.
+REQUIRED_TABLES = ['routes', 'trips', 'stop_times']
+# Split keys selecting routes (and, with service_date, trips).
+FILTER_KEYS = ['routes_to_include', 'routes_to_exclude', 'route_types', 'route_id_pattern', 'agency_ids',
+               'service_date']
+
+
+def load_split_specs(config):
+    """
+    Returns the route splits listed in a Process_GTFS_Filter.json config.
+
+    A config either describes one split with top-level 'output_gtfs_folder_name'
+    and filter keys, or lists several under 'splits', all cut from the same input feed:
+
+        "splits": [
+            {"name": "Exclude_RT", "output_gtfs_folder_name": "MBTA_Exclude_RT", "routes_to_exclude": [...]},
+            {"name": "RT_Only", "output_gtfs_folder_name": "MBTA_RT_Only", "routes_to_include": [...]}
+        ]
+
+    Filter keys, all optional, combine so a route is kept only if it passes each given one:
+        routes_to_include / routes_to_exclude: Lists of route_ids.
+        route_types: List of route_type codes, e.g. [0, 1] for light rail and subway.
+        route_id_pattern: Regular expression the whole route_id must match, e.g. "Green-.*".
+        agency_ids: List of agency_ids.
+        service_date: "YYYYMMDD". Keeps only the trips running on that date, e.g. a
+            representative weekday.
+
+    Raises:
+        ValueError: If a split has no output folder, no filter, or an invalid pattern or date.
+    """
+    specs = config.get('splits')
+    if specs is None:
+        specs = [{key: config[key] for key in ['output_gtfs_folder_name'] + FILTER_KEYS if key in config}]
+    result = []
+    for spec in specs:
+        output_gtfs_folder_name = spec.get('output_gtfs_folder_name', None)
+        if not output_gtfs_folder_name:
+            raise ValueError("Missing 'output_gtfs_folder_name' in the JSON config.")
+        spec = {
+            'name': spec.get('name', output_gtfs_folder_name),
+            'output_gtfs_folder_name': output_gtfs_folder_name,
+            # IDs are text in the feed, so [1] and ["1"] mean the same.
+            'routes_to_include': [str(route_id) for route_id in spec.get('routes_to_include', [])],
+            'routes_to_exclude': [str(route_id) for route_id in spec.get('routes_to_exclude', [])],
+            'route_types': [int(route_type) for route_type in spec.get('route_types', [])],
+            'route_id_pattern': spec.get('route_id_pattern', None),
+            'agency_ids': [str(agency_id) for agency_id in spec.get('agency_ids', [])],
+            'service_date': str(spec['service_date']) if spec.get('service_date') else None,
+        }
+        # Ensure at least one filter is given
+        if not any(spec[key] for key in FILTER_KEYS):
+            raise ValueError(f"No routes_to_include, routes_to_exclude or other filter given for split "
+                             f"'{spec['name']}'. No filtering will be applied.")
+        if spec['route_id_pattern']:
+            try:
+                re.compile(spec['route_id_pattern'])
+            except re.error as e:
+                raise ValueError(f"Invalid 'route_id_pattern' for split '{spec['name']}': {e}")
+        if spec['service_date']:
+            try:
+                datetime.datetime.strptime(spec['service_date'], '%Y%m%d')
+            except ValueError:
+                raise ValueError(f"Invalid 'service_date' for split '{spec['name']}': "
+                                 f"'{spec['service_date']}' is not YYYYMMDD.")
+        result.append(spec)
+    if not result:
+        raise ValueError("No splits listed in the JSON config.")
+    return result
+
+
+def describe_split(spec):
+    """Lines describing a split's filters, for the progress messages."""
+    lines = []
+    if spec['routes_to_include']:
+        lines.append(f"Including routes: {spec['routes_to_include']}")
+    if spec['routes_to_exclude']:
+        lines.append(f"Excluding routes: {spec['routes_to_exclude']}")
+    if spec['route_types']:
+        lines.append(f"Route types: {spec['route_types']}")
+    if spec['route_id_pattern']:
+        lines.append(f"Route IDs matching: {spec['route_id_pattern']}")
+    if spec['agency_ids']:
+        lines.append(f"Agencies: {spec['agency_ids']}")
+    if spec['service_date']:
+        lines.append(f"Trips running on: {spec['service_date']}")
+    return lines
+
+
+def _codes(values, categories):
+    """Positions of values in categories (a pd.Index of unique values), -1 when absent."""
+    return categories.get_indexer(values)
+
+
+class RouteSplitIndex:
+    """
+    Route -> trip -> stop_time (and shape) positions of a feed, built once so
+    any number of route splits can be cut from the same in-memory feed with
+    boolean masks instead of re-scanning the large tables by ID.
+
+    restrict(route_ids) returns the same tables as gtfs_kit's restrict_to_routes;
+    restrict(route_ids, service_ids) also drops the trips of other services.
+    """
+
+    def __init__(self, feed):
+        self.feed = feed
+        trips = feed.trips
+        self.trip_ids = pd.Index(pd.unique(trips['trip_id']))
+        self.route_ids = pd.Index(pd.unique(trips['route_id'].dropna()))
+        self._trip_codes = _codes(trips['trip_id'], self.trip_ids)
+        self._trip_route_codes = _codes(trips['route_id'], self.route_ids)
+        self.service_ids = pd.Index(pd.unique(trips['service_id'].dropna()))
+        self._trip_service_codes = _codes(trips['service_id'], self.service_ids)
+        self._stop_time_trips = _codes(feed.stop_times['trip_id'], self.trip_ids)
+        self._frequency_trips = (
+            _codes(feed.frequencies['trip_id'], self.trip_ids) if feed.frequencies is not None else None
+        )
+        self.shape_ids = None
+        if feed.shapes is not None and 'shape_id' in trips.columns:
+            self.shape_ids = pd.Index(pd.unique(feed.shapes['shape_id']))
+            self._shapes = _codes(feed.shapes['shape_id'], self.shape_ids)
+            self._trip_shapes = _codes(trips['shape_id'], self.shape_ids)
+
+    def trip_mask(self, route_ids, service_ids=None):
+        """
+        Boolean mask over trips whose trip_id belongs to a trip of the given
+        routes (and, if service_ids is given, of one of those services).
+        """
+        route_mask = self.route_ids.isin(list(route_ids))
+        kept_trips = np.zeros(len(self.trip_ids), dtype=bool)
+        on_routes = self._trip_route_codes >= 0
+        on_routes[on_routes] = route_mask[self._trip_route_codes[on_routes]]
+        if service_ids is not None:
+            service_mask = self.service_ids.isin(list(service_ids))
+            on_routes &= self._trip_service_codes >= 0
+            on_routes[on_routes] = service_mask[self._trip_service_codes[on_routes]]
+        kept_trips[self._trip_codes[on_routes]] = True
+        return kept_trips
+
+    def restrict(self, route_ids, service_ids=None):
+        """
+        Builds a new feed with only the given routes (and services) and the trips,
+        stop times, stops (with their parent stations), calendars, agencies,
+        frequencies, shapes and transfers they use.
+        """
+        feed = self.feed
+        kept_trips = self.trip_mask(route_ids, service_ids)
+        trips = feed.trips.loc[kept_trips[self._trip_codes]]
+        tables = {'trips': trips}
+        tables['routes'] = feed.routes.loc[feed.routes['route_id'].isin(trips['route_id'])]
+        stop_time_mask = self._stop_time_trips >= 0
+        stop_time_mask[stop_time_mask] = kept_trips[self._stop_time_trips[stop_time_mask]]
+        tables['stop_times'] = feed.stop_times.loc[stop_time_mask]
+
+        # Stops, collecting parent stations too
+        stop_ids = set(tables['stop_times']['stop_id'])
+        if 'parent_station' in feed.stops:
+            stop_ids |= set(feed.stops.loc[feed.stops['stop_id'].isin(stop_ids), 'parent_station'].dropna())
+        tables['stops'] = feed.stops.loc[feed.stops['stop_id'].isin(stop_ids)]
+
+        service_ids = trips['service_id'].unique()
+        for table in ('calendar', 'calendar_dates'):
+            if getattr(feed, table) is not None:
+                tables[table] = getattr(feed, table).loc[getattr(feed, table)['service_id'].isin(service_ids)]
+        tables['agency'] = feed.agency
+        if 'agency_id' in feed.routes.columns and feed.agency is not None:
+            tables['agency'] = feed.agency.loc[feed.agency['agency_id'].isin(tables['routes']['agency_id'])]
+        if self._frequency_trips is not None:
+            frequency_mask = self._frequency_trips >= 0
+            frequency_mask[frequency_mask] = kept_trips[self._frequency_trips[frequency_mask]]
+            tables['frequencies'] = feed.frequencies.loc[frequency_mask]
+        if feed.shapes is not None:
+            if self.shape_ids is not None:
+                kept_shapes = np.zeros(len(self.shape_ids), dtype=bool)
+                trip_shapes = self._trip_shapes[kept_trips[self._trip_codes]]
+                kept_shapes[trip_shapes[trip_shapes >= 0]] = True
+                shape_mask = self._shapes >= 0
+                shape_mask[shape_mask] = kept_shapes[self._shapes[shape_mask]]
+                tables['shapes'] = feed.shapes.loc[shape_mask]
+            else:
+                tables['shapes'] = feed.shapes.iloc[0:0]
+        if feed.transfers is not None:
+            tables['transfers'] = feed.transfers.loc[
+                feed.transfers['from_stop_id'].isin(stop_ids) & feed.transfers['to_stop_id'].isin(stop_ids)
+            ]
+        for table in UNFILTERED_TABLES:
+            tables[table] = getattr(feed, table, None)
+        return Feed(dist_units=feed.dist_units, **tables)
+
+    def selection(self, spec):
+        """Resolves a split's filters to (route IDs kept, service IDs kept or None)."""
+        feed = self.feed
+        return (routes_to_keep(spec, feed.routes),
+                services_to_keep(spec, feed.calendar, feed.calendar_dates))
+
+
+def routes_to_keep(spec, routes):
+    """
+    Resolves a split's route filters against the feed's routes table.
+
+    Returns:
+        list: The route IDs passing every filter given.
+    """
+    route_ids = routes['route_id']
+    keep = pd.Series(True, index=routes.index)
+    if spec['routes_to_include']:
+        keep &= route_ids.isin(spec['routes_to_include'])
+    if spec['routes_to_exclude']:
+        keep &= ~route_ids.isin(spec['routes_to_exclude'])
+    if spec['route_types']:
+        # Numeric in gtfs_kit's tables, text in the streaming engine's.
+        keep &= pd.to_numeric(routes['route_type'], errors='coerce').isin(spec['route_types'])
+    if spec['route_id_pattern']:
+        keep &= route_ids.astype(str).str.fullmatch(spec['route_id_pattern']).astype(bool)
+    if spec['agency_ids']:
+        if 'agency_id' not in routes.columns:
+            raise ValueError("'agency_ids' is given but routes.txt has no agency_id column.")
+        keep &= routes['agency_id'].isin(spec['agency_ids'])
+    return list(pd.unique(route_ids[keep.to_numpy()]))
+
+
+def services_on_date(date, calendar, calendar_dates):
+    """
+    service_ids running on a YYYYMMDD date: calendar.txt services covering the
+    date on its weekday, plus calendar_dates.txt additions, minus its removals.
+    """
+    services = set()
+    if calendar is not None:
+        weekday = datetime.datetime.strptime(date, '%Y%m%d').strftime('%A').lower()
+        running = ((calendar['start_date'].astype(str) <= date) & (calendar['end_date'].astype(str) >= date)
+                   & (pd.to_numeric(calendar[weekday], errors='coerce') == 1))
+        services = set(calendar.loc[running.fillna(False).to_numpy(dtype=bool), 'service_id'])
+    if calendar_dates is not None:
+        on_date = calendar_dates.loc[(calendar_dates['date'].astype(str) == date).to_numpy(dtype=bool)]
+        exception_type = pd.to_numeric(on_date['exception_type'], errors='coerce')
+        services |= set(on_date.loc[(exception_type == 1).fillna(False).to_numpy(dtype=bool), 'service_id'])
+        services -= set(on_date.loc[(exception_type == 2).fillna(False).to_numpy(dtype=bool), 'service_id'])
+    return services
+
+
+def services_to_keep(spec, calendar, calendar_dates):
+    """The service IDs a split keeps, or None when it has no service_date."""
+    if not spec['service_date']:
+        return None
+    return services_on_date(spec['service_date'], calendar, calendar_dates)
+
+
+def _no_routes_error(spec):
+    return ValueError(f"The filters of split '{spec['name']}' leave no routes with trips. Nothing was written.")
+
+
+def _table_path(gtfs_folder, table):
+    return os.path.join(gtfs_folder, f"{table}.txt")
+
+
+def _remove_output(output_path):
+    # An earlier run may have left a hard link to the input file here: remove it
+    # rather than writing through it.
+    if os.path.lexists(output_path):
+        os.remove(output_path)
+
+
+def write_table(df, output_path):
+    """Writes a filtered table as gtfs_kit's Feed.to_file does."""
+    _remove_output(output_path)
+    df.to_csv(output_path, index=False)
+
+
+def link_or_copy(source_path, output_path, hardlink=True):
+    """
+    Places a byte-for-byte copy of a file: a hard link when hardlink is set and
+    the file system allows it (no data is written), else a copy.
+    """
+    _remove_output(output_path)
+    if hardlink:
+        try:
+            os.link(source_path, output_path)
+            return
+        except OSError:
+            pass
+    shutil.copyfile(source_path, output_path)
+
+
+def side_files(gtfs_folder):
+    """
+    Files of a feed folder that gtfs_kit does not read (e.g. STOPS' pnr.txt and
+    MBTA_Stopid_lookup.csv). Hidden files and subfolders such as .gtfs_cache are left out.
+    """
+    tables = {f"{table}.txt" for table in cs.DTYPES}
+    return sorted(name for name in os.listdir(gtfs_folder)
+                  if not name.startswith('.') and name not in tables
+                  and os.path.isfile(os.path.join(gtfs_folder, name)))
+
+
+def pass_through_side_files(input_gtfs_folder, output_gtfs_folder, hardlink=True):
+    """Copies the side files of the input feed to a split unchanged. Returns their number."""
+    names = side_files(input_gtfs_folder)
+    for name in names:
+        link_or_copy(os.path.join(input_gtfs_folder, name), os.path.join(output_gtfs_folder, name), hardlink)
+    return len(names)
+
+
+def write_split(index, spec, output_gtfs_folder, input_gtfs_folder=None, hardlink=True):
+    """
+    Cuts one split from the indexed feed and writes it.
+
+    Only tables the filter shrank are written through pandas. With
+    input_gtfs_folder, tables that keep all their rows are copied from the input
+    feed byte for byte (see link_or_copy), as are its side files.
+
+    Returns:
+        tuple: (number of routes kept, seconds taken, files copied unchanged)
+
+    Raises:
+        ValueError: If the split's filters leave no trips.
+    """
+    start_time = time.time()
+    route_ids, service_ids = index.selection(spec)
+    if not index.trip_mask(route_ids, service_ids).any():
+        raise _no_routes_error(spec)
+    filtered_feed = index.restrict(route_ids, service_ids)
+    # Create the output directory if it doesn't exist
+    if not os.path.exists(output_gtfs_folder):
+        os.makedirs(output_gtfs_folder)
+    n_copied = 0
+    for table in cs.DTYPES:
+        df = getattr(filtered_feed, table)
+        if df is None:
+            continue
+        source_df = getattr(index.feed, table)
+        output_path = _table_path(output_gtfs_folder, table)
+        # Filters only drop rows, so a table with as many rows as the input is unchanged.
+        if input_gtfs_folder is not None and source_df is not None and len(df) == len(source_df):
+            link_or_copy(_table_path(input_gtfs_folder, table), output_path, hardlink)
+            n_copied += 1
+        else:
+            write_table(df, output_path)
+    if input_gtfs_folder is not None:
+        n_copied += pass_through_side_files(input_gtfs_folder, output_gtfs_folder, hardlink)
+    return len(filtered_feed.routes), time.time() - start_time, n_copied
 
-def filter_gtfs(input_path):
+
+def _read_text_table(gtfs_folder, table, chunksize=None):
+    """
+    Reads a GTFS table keeping every value as its original text (missing values
+    as ''), so rows are written back unchanged. Returns None when the file is
+    absent or empty, like gtfs_kit; with chunksize, an iterator of chunks.
+    """
+    path = _table_path(gtfs_folder, table)
+    if not os.path.isfile(path) or not os.path.getsize(path):
+        return None
+    reader = pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8-sig', chunksize=chunksize)
+    if chunksize is None:
+        reader.columns = reader.columns.str.strip()
+        return reader
+    return (chunk.rename(columns=str.strip) for chunk in reader)
+
+
+class _ChunkWriter:
+    """Appends filtered chunks of one table to each split's output file."""
+
+    def __init__(self, output_folders, table):
+        self.paths = [_table_path(folder, table) for folder in output_folders]
+        for path in self.paths:
+            _remove_output(path)
+        self.files = [open(path, 'w', newline='', encoding='utf-8') for path in self.paths]
+        self.header_written = False
+
+    def write(self, chunk, masks):
+        for output_file, mask in zip(self.files, masks):
+            chunk.loc[mask].to_csv(output_file, index=False, header=not self.header_written)
+        self.header_written = True
+
+    def close(self):
+        for output_file in self.files:
+            output_file.close()
+
+
+def _stream_table(input_gtfs_folder, table, output_folders, id_column, ids, kept_by_split, chunk_rows, on_chunk=None):
+    """
+    Streams a large table in chunks, writing to each split the rows whose
+    id_column value is kept (kept_by_split holds one mask over ids per split).
+    on_chunk(chunk, masks) sees every chunk, e.g. to collect the stops used.
+
+    Returns:
+        tuple: (rows written per split, rows read)
+    """
+    chunks = _read_text_table(input_gtfs_folder, table, chunksize=chunk_rows)
+    rows_written = [0] * len(output_folders)
+    rows_read = 0
+    if chunks is None:
+        return rows_written, rows_read
+    writer = _ChunkWriter(output_folders, table)
+    try:
+        for chunk in chunks:
+            codes = ids.get_indexer(chunk[id_column])
+            found = codes >= 0
+            masks = []
+            for kept in kept_by_split:
+                mask = found.copy()
+                mask[found] = kept[codes[found]]
+                masks.append(mask)
+            writer.write(chunk, masks)
+            if on_chunk is not None:
+                on_chunk(chunk, masks)
+            rows_written = [count + int(mask.sum()) for count, mask in zip(rows_written, masks)]
+            rows_read += len(chunk)
+    finally:
+        writer.close()
+    return rows_written, rows_read
+
+
+def stream_splits(input_gtfs_folder, specs, output_folders, chunk_rows=DEFAULT_CHUNK_ROWS, hardlink=True):
+    """
+    Writes every split without loading the feed: the kept trip and shape IDs are
+    resolved from the small tables first, then stop_times.txt and shapes.txt are
+    streamed once in chunks of chunk_rows rows, writing only matching rows to each
+    split. Peak memory depends on the chunk size and the small tables, not on the
+    number of stop times or shape points. Values are written as they appear in
+    the input, and the tables kept are those of restrict_to_routes. Tables that
+    keep all their rows and the feed's side files are copied as in write_split.
+
+    Returns:
+        dict: (number of routes kept, seconds taken, files copied unchanged) by split
+            name, or a ValueError for a split whose filters leave no trips.
+    """
+    start_time = time.time()
+    small = {table: _read_text_table(input_gtfs_folder, table)
+             for table in ['agency', 'routes', 'trips', 'stops', 'calendar', 'calendar_dates',
+                           'frequencies', 'transfers'] + UNFILTERED_TABLES}
+    trips, stops = small['trips'], small['stops']
+    trip_ids = pd.Index(pd.unique(trips['trip_id']))
+    trip_codes = trip_ids.get_indexer(trips['trip_id'])
+    has_shapes = 'shape_id' in trips.columns
+    shape_ids = pd.Index(pd.unique(trips['shape_id'])) if has_shapes else pd.Index([])
+
+    kept_trips_by_split, kept_shapes_by_split, trip_rows_by_split = [], [], []
+    for spec in specs:
+        trip_rows = trips['route_id'].isin(routes_to_keep(spec, small['routes'])).to_numpy()
+        service_ids = services_to_keep(spec, small['calendar'], small['calendar_dates'])
+        if service_ids is not None:
+            trip_rows = trip_rows & trips['service_id'].isin(service_ids).to_numpy()
+        kept_trips = np.zeros(len(trip_ids), dtype=bool)
+        kept_trips[trip_codes[trip_rows]] = True
+        # Mirror restrict_to_trips: every trips row sharing a kept trip_id stays.
+        trip_rows = kept_trips[trip_codes]
+        kept_shapes = np.zeros(len(shape_ids), dtype=bool)
+        if has_shapes:
+            kept_shapes[shape_ids.get_indexer(trips.loc[trip_rows, 'shape_id'])] = True
+        trip_rows_by_split.append(trip_rows)
+        kept_trips_by_split.append(kept_trips)
+        kept_shapes_by_split.append(kept_shapes)
+
+    # Splits left without trips are reported and not written.
+    failed = {spec['name']: _no_routes_error(spec) for spec, trip_rows in zip(specs, trip_rows_by_split)
+              if not trip_rows.any()}
+    if failed:
+        kept = [i for i, spec in enumerate(specs) if spec['name'] not in failed]
+        specs, output_folders, trip_rows_by_split, kept_trips_by_split, kept_shapes_by_split = (
+            [values[i] for i in kept] for values in
+            (specs, output_folders, trip_rows_by_split, kept_trips_by_split, kept_shapes_by_split))
+        if not specs:
+            return failed
+    for folder in output_folders:
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+    # Stops used by each split, collected while its stop times are written.
+    used_stops = [set() for _ in specs]
+
+    def collect_stops(chunk, masks):
+        for stop_ids, mask in zip(used_stops, masks):
+            stop_ids.update(chunk.loc[mask, 'stop_id'])
+
+    n_copied = [0] * len(specs)
+    for table, id_column, ids, kept_by_split, on_chunk in (
+            ('stop_times', 'trip_id', trip_ids, kept_trips_by_split, collect_stops),
+            ('shapes', 'shape_id', shape_ids, kept_shapes_by_split, None)):
+        rows_written, rows_read = _stream_table(input_gtfs_folder, table, output_folders, id_column, ids,
+                                                kept_by_split, chunk_rows, on_chunk)
+        for i, (folder, count) in enumerate(zip(output_folders, rows_written)):
+            if rows_read and count == rows_read:
+                link_or_copy(_table_path(input_gtfs_folder, table), _table_path(folder, table), hardlink)
+                n_copied[i] += 1
+
+    route_counts = {}
+    for i, (spec, folder, trip_rows, kept_trips, stop_ids) in enumerate(zip(
+            specs, output_folders, trip_rows_by_split, kept_trips_by_split, used_stops)):
+        tables = {'trips': trips.loc[trip_rows]}
+        tables['routes'] = small['routes'].loc[small['routes']['route_id'].isin(tables['trips']['route_id'])]
+        if 'parent_station' in stops.columns:
+            stop_ids |= set(stops.loc[stops['stop_id'].isin(stop_ids), 'parent_station']) - {''}
+        tables['stops'] = stops.loc[stops['stop_id'].isin(stop_ids)]
+        service_ids = tables['trips']['service_id'].unique()
+        for table in ('calendar', 'calendar_dates'):
+            if small[table] is not None:
+                tables[table] = small[table].loc[small[table]['service_id'].isin(service_ids)]
+        tables['agency'] = small['agency']
+        if 'agency_id' in small['routes'].columns and small['agency'] is not None:
+            tables['agency'] = small['agency'].loc[small['agency']['agency_id'].isin(tables['routes']['agency_id'])]
+        if small['frequencies'] is not None:
+            tables['frequencies'] = small['frequencies'].loc[
+                small['frequencies']['trip_id'].isin(trip_ids[kept_trips])
+            ]
+        if small['transfers'] is not None:
+            transfers = small['transfers']
+            tables['transfers'] = transfers.loc[
+                transfers['from_stop_id'].isin(stop_ids) & transfers['to_stop_id'].isin(stop_ids)
+            ]
+        for table in UNFILTERED_TABLES:
+            tables[table] = small[table]
+        for table, df in tables.items():
+            if df is None:
+                continue
+            if len(df) == len(small[table]):
+                link_or_copy(_table_path(input_gtfs_folder, table), _table_path(folder, table), hardlink)
+                n_copied[i] += 1
+            else:
+                write_table(df, _table_path(folder, table))
+        n_copied[i] += pass_through_side_files(input_gtfs_folder, folder, hardlink)
+        route_counts[spec['name']] = len(tables['routes'])
+    seconds = time.time() - start_time
+    results = {spec['name']: (route_counts[spec['name']], seconds, n_copied[i]) for i, spec in enumerate(specs)}
+    results.update(failed)
+    return results
+
+
+# Indexed feed shared by the splits run in a worker process.
+_worker_index = None
+
+
+def _init_worker(index):
+    """Receives the indexed feed once per worker process."""
+    global _worker_index
+    _worker_index = index
+
+
+def _write_split_in_worker(spec, output_gtfs_folder, input_gtfs_folder, hardlink):
+    """Runs write_split in a worker process on the feed sent by _init_worker."""
+    return write_split(_worker_index, spec, output_gtfs_folder, input_gtfs_folder, hardlink)
+
+
+def filter_gtfs(input_path, max_workers=1, engine=None, chunk_rows=None, feed_cache=True):
     """
     Parses a GTFS feed, filters it based on a JSON config file,
-    and saves the filtered feed to a new output folder.
-    
+    and saves each filtered feed to its output folder.
+
+    The input feed is read and indexed once, however many splits the config lists.
+
     Args:
         input_path (str): The path to the subfolder containing
                           the config file.
+        max_workers (int): Processes writing splits in parallel.
+        engine (str, optional): 'feed' loads the feed with gtfs_kit, 'streaming'
+            streams stop_times.txt and shapes.txt (see stream_splits). Defaults to
+            the config's "engine", else 'feed'.
+        chunk_rows (int, optional): Rows per chunk for the streaming engine.
+            Defaults to the config's "chunk_rows".
+        feed_cache (bool): Load the feed engine's tables through the parsed
+            table cache (gtfs_feed_cache), kept in the config's "feed_cache_dir"
+            or else in .gtfs_cache inside the input GTFS folder.
+
+    Tables the filter leaves whole and the feed's side files (pnr.txt,
+    MBTA_Stopid_lookup.csv, ...) are hard linked into each output folder, or
+    copied when "hardlink_unchanged" is false in the config or the file system
+    has no hard links.
+
+    Returns:
+        bool: True if every split was written.
     """
     # Define file paths
-    config_file = os.path.join(input_path, 'Process_GTFS_Filter.json')
+    config_file = os.path.join(input_path, CONFIG_FILE_NAME)
 
     # 1. Read the JSON configuration file
     try:
         with open(config_file, 'r') as f:
             config = json.load(f)
-        
-        # Get folder names and routes to include/exclude from the config
-        input_gtfs_folder_name = config.get('input_gtfs_folder_name', None)
-        output_gtfs_folder_name = config.get('output_gtfs_folder_name', None)
-        routes_to_include = config.get('routes_to_include', [])
-        routes_to_exclude = config.get('routes_to_exclude', [])
-
-        if not all([input_gtfs_folder_name, output_gtfs_folder_name]):
-            print("Error: Missing 'input_gtfs_folder_name' or 'output_gtfs_folder_name' in the JSON config.")
-            return
 
-        # Ensure at least one filtering list is non-empty
-        if not routes_to_include and not routes_to_exclude:
-            print("Error: Both 'routes_to_include' and 'routes_to_exclude' are empty. No filtering will be applied.")
-            return
+        input_gtfs_folder_name = config.get('input_gtfs_folder_name', None)
+        if not input_gtfs_folder_name:
+            print("Error: Missing 'input_gtfs_folder_name' in the JSON config.")
+            return False
+        specs = load_split_specs(config)
+        engine = engine or config.get('engine', 'feed')
+        if engine not in ('feed', 'streaming'):
+            print(f"Error: Unknown engine '{engine}'. Use 'feed' or 'streaming'.")
+            return False
+        chunk_rows = chunk_rows or config.get('chunk_rows', DEFAULT_CHUNK_ROWS)
+        feed_cache_dir = config.get('feed_cache_dir', None)
+        hardlink = config.get('hardlink_unchanged', True)
 
     except FileNotFoundError:
         print(f"Error: Configuration file not found at '{config_file}'")
-        return
+        return False
     except json.JSONDecodeError:
         print(f"Error: Invalid JSON format in '{config_file}'.")
-        return
+        return False
+    except ValueError as e:
+        print(f"Error: {e}")
+        return False
 
-    # Dynamically construct input and output folder paths
+    # Dynamically construct input folder path
     input_gtfs_folder = os.path.join(input_path, input_gtfs_folder_name)
-    output_gtfs_folder = os.path.join(input_path, output_gtfs_folder_name)
 
     # 2. Check if the input GTFS folder exists
     if not os.path.isdir(input_gtfs_folder):
         print(f"Error: Input GTFS folder not found at '{input_gtfs_folder}'")
-        return
+        return False
+    # Splits are cut by route through trips and stop times, so these tables must be there.
+    missing = [f"{table}.txt" for table in REQUIRED_TABLES
+               if not os.path.isfile(_table_path(input_gtfs_folder, table))
+               or not os.path.getsize(_table_path(input_gtfs_folder, table))]
+    if missing:
+        print(f"Error: Input GTFS folder '{input_gtfs_folder}' has no {', '.join(missing)}")
+        return False
 
-    # 3. Read and filter the GTFS feed
-    print(f"Loading GTFS feed from: {input_gtfs_folder}")
-    feed = read_feed(input_gtfs_folder, dist_units='m')
+    for spec in specs:
+        for line in describe_split(spec):
+            print(f"[{spec['name']}] {line}")
+    outputs = {spec['name']: os.path.join(input_path, spec['output_gtfs_folder_name']) for spec in specs}
+    success = True
 
-    print(f"Original feed has {len(feed.routes)} routes.")
+    if engine == 'streaming':
+        # 3. Stream the large tables once for every split
+        print(f"Streaming GTFS feed from: {input_gtfs_folder} ({chunk_rows:,} rows per chunk)")
+        try:
+            results = stream_splits(input_gtfs_folder, specs, [outputs[spec['name']] for spec in specs],
+                                    chunk_rows, hardlink)
+        except Exception as e:
+            results = {spec['name']: e for spec in specs}
+    else:
+        # 3. Read and index the GTFS feed once for every split
+        print(f"Loading GTFS feed from: {input_gtfs_folder}")
+        try:
+            if feed_cache:
+                if feed_cache_dir:
+                    feed_cache_dir = os.path.join(input_path, feed_cache_dir)
+                cache = GTFSFeedCache(feed_cache_dir or default_cache_dir(input_gtfs_folder))
+                feed = cache.load_feed(input_gtfs_folder, dist_units='m')
+                print(f"GTFS cache: {cache.hits} tables loaded from cache, {cache.misses} parsed.")
+            else:
+                feed = read_feed(input_gtfs_folder, dist_units='m')
+            print(f"Original feed has {len(feed.routes)} routes.")
+            index = RouteSplitIndex(feed)
+        except Exception as e:
+            print(f"Error: Could not read or index the GTFS feed at '{input_gtfs_folder}': {e}")
+            return False
 
-    # Apply filtering based on which list is provided
-    try:
-        if routes_to_include:
-            print(f"Including routes: {routes_to_include}")
-            filtered_feed = feed.restrict_to_routes(routes_to_include)
-        elif routes_to_exclude:
-            print(f"Excluding routes: {routes_to_exclude}")
-            all_route_ids = set(feed.routes['route_id'].unique())
-            routes_to_keep = list(all_route_ids - set(routes_to_exclude))
-            filtered_feed = feed.restrict_to_routes(routes_to_keep)
+        # 4. Filter and write every split from the shared feed
+        results = {}
+        if max_workers > 1 and len(specs) > 1:
+            with ProcessPoolExecutor(max_workers=min(max_workers, len(specs)),
+                                     initializer=_init_worker, initargs=(index,)) as executor:
+                futures = {executor.submit(_write_split_in_worker, spec, outputs[spec['name']],
+                                           input_gtfs_folder, hardlink): spec
+                           for spec in specs}
+                for future in as_completed(futures):
+                    spec = futures[future]
+                    try:
+                        results[spec['name']] = future.result()
+                    except Exception as e:
+                        results[spec['name']] = e
         else:
-            print("No routes to filter. Keeping original feed.")
-            filtered_feed = feed
-    except Exception as e:
-        print(f"An error occurred during filtering: {e}")
-        return
+            for spec in specs:
+                try:
+                    results[spec['name']] = write_split(index, spec, outputs[spec['name']],
+                                                        input_gtfs_folder, hardlink)
+                except Exception as e:
+                    results[spec['name']] = e
 
-    print(f"Filtered feed has {len(filtered_feed.routes)} routes.")
+    for spec in specs:
+        result = results[spec['name']]
+        if isinstance(result, Exception):
+            print(f"[{spec['name']}] An error occurred while filtering or writing the feed: {result}")
+            success = False
+        else:
+            n_routes, seconds, n_copied = result
+            print(f"[{spec['name']}] Filtered feed has {n_routes} routes. "
+                  f"Saved to: {outputs[spec['name']]} ({seconds:.1f}s, {n_copied} files copied unchanged)")
+    return success
 
-    # 4. Create the output directory if it doesn't exist
-    if not os.path.exists(output_gtfs_folder):
-        os.makedirs(output_gtfs_folder)
-        print(f"Created output directory: {output_gtfs_folder}")
-    
-    # 5. Write the filtered feed to the output directory
+
+def find_split_folders(root):
+    """
+    Returns every folder under root (root included) holding a
+    Process_GTFS_Filter.json, sorted. Hidden folders such as .gtfs_cache are skipped.
+    """
+    folders = []
+    for folder, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d != '__pycache__')
+        if CONFIG_FILE_NAME in files:
+            folders.append(folder)
+    return sorted(folders)
+
+
+class _ProcessMemoryCounters(ctypes.Structure):
+    """PROCESS_MEMORY_COUNTERS filled by GetProcessMemoryInfo on Windows."""
+    _fields_ = [('cb', ctypes.c_ulong), ('PageFaultCount', ctypes.c_ulong),
+                ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where it cannot be read."""
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+        scale = 1024 ** 2 if platform.system() == 'Darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
     try:
-        # v- CHANGE 2: Updated the write command
-        filtered_feed.write(output_gtfs_folder)
-        print(f"Successfully saved filtered GTFS feed to: {output_gtfs_folder}")
-    except Exception as e:
-        print(f"An error occurred while writing the filtered feed: {e}")
+        counters = _ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize / 1024 ** 2
+    except (AttributeError, OSError):
+        pass
+    return None
+
+
+def _run_split_job(input_path, engine, chunk_rows, feed_cache):
+    """
+    Runs filter_gtfs for one folder, capturing its messages. run_batch gives
+    every job a fresh worker process, so the peak memory is the job's own.
+
+    Returns:
+        tuple: (success, seconds, peak memory in MB or None, captured output).
+    """
+    log = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(log):
+        try:
+            success = filter_gtfs(input_path, 1, engine, chunk_rows, feed_cache)
+        except Exception as e:
+            print(f"Error: {type(e).__name__}: {e}")
+            success = False
+    return success, time.perf_counter() - start, _peak_rss_mb(), log.getvalue()
+
+
+def run_batch(root, max_workers=1, engine=None, chunk_rows=None, feed_cache=True):
+    """
+    Splits every feed folder found under root, several folders at once on a
+    process pool, and prints each folder's messages with its time and peak memory.
+
+    Args:
+        root (str): Folder searched for Process_GTFS_Filter.json files.
+        max_workers (int): Folders processed in parallel. Splits of one folder
+            are written one after the other.
+        engine, chunk_rows, feed_cache: As for filter_gtfs.
+
+    Returns:
+        bool: True if every folder was split.
+    """
+    folders = find_split_folders(root)
+    if not folders:
+        print(f"Error: No {CONFIG_FILE_NAME} found under '{root}'")
+        return False
+    print(f"Splitting {len(folders)} folder(s) under {root} with {min(max_workers, len(folders))} worker(s).")
+
+    results = {}
+    start = time.perf_counter()
+    # One process per folder (Python 3.11+), so each job's peak memory is its own.
+    pool_options = {'max_tasks_per_child': 1} if sys.version_info >= (3, 11) else {}
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(folders)), **pool_options) as executor:
+        futures = {executor.submit(_run_split_job, folder, engine, chunk_rows, feed_cache): folder
+                   for folder in folders}
+        for future in as_completed(futures):
+            folder = futures[future]
+            try:
+                results[folder] = future.result()
+            except Exception as e:
+                results[folder] = (False, 0.0, None, f"Error: The worker failed: {e}\n")
+            print(f"\n===== {os.path.relpath(folder, root)} =====\n{results[folder][3]}", end='')
+
+    print("\nSummary:")
+    for folder in folders:
+        success, seconds, peak_mb, _ = results[folder]
+        peak = f"{peak_mb:,.0f} MB" if peak_mb is not None else 'n/a'
+        print(f"  {'OK    ' if success else 'FAILED'}  {os.path.relpath(folder, root):<40} "
+              f"{seconds:8.1f}s  peak {peak:>9}")
+    n_failed = sum(not results[folder][0] for folder in folders)
+    print(f"{len(folders) - n_failed} of {len(folders)} folder(s) split in {time.perf_counter() - start:.1f}s.")
+    return n_failed == 0
+
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("Usage: python GTFS_filter.py <path_to_subfolder>")
+    parser = argparse.ArgumentParser(description="Split a GTFS feed by route as described in Process_GTFS_Filter.json.")
+    parser.add_argument("path", nargs='?', default=None,
+                        help="Path to the subfolder containing Process_GTFS_Filter.json.")
+    parser.add_argument("--all", action='store_true',
+                        help="Split every subfolder holding a Process_GTFS_Filter.json under --root.")
+    parser.add_argument("--root", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="Folder searched by --all (default: this script's folder).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes writing splits in parallel (with --all: subfolders processed in parallel).")
+    parser.add_argument("--engine", choices=['feed', 'streaming'], default=None,
+                        help="'streaming' filters stop_times.txt and shapes.txt in chunks (default: config or 'feed').")
+    parser.add_argument("--chunk-rows", type=int, default=None, help="Rows per chunk for the streaming engine.")
+    parser.add_argument("--no-feed-cache", action='store_true',
+                        help="Parse the GTFS text files without the binary table cache.")
+    args = parser.parse_args()
+    if args.all:
+        ok = run_batch(args.root, max(1, args.workers), args.engine, args.chunk_rows, not args.no_feed_cache)
+    elif args.path:
+        ok = filter_gtfs(args.path, max(1, args.workers), args.engine, args.chunk_rows, not args.no_feed_cache)
     else:
-        path = sys.argv[1]
-        filter_gtfs(path)
\ No newline at end of file
+        parser.error("Give the path of a subfolder, or --all.")
+    sys.exit(0 if ok else 1)
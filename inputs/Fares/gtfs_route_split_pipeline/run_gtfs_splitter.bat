@@ -64,7 +64,7 @@ ECHO All packages are ready.
 ECHO.
 
 :: Prompt the user to enter the subfolder name.
-set /p "input_subfolder=Please enter the name of the subfolder (e.g., '2024GTFS_RT'): "
+set /p "input_subfolder=Please enter the name of the subfolder (e.g., '2024GTFS_RT'), or 'all' to split every subfolder: "
 
 :: Check if the user actually entered a value.
 if "%input_subfolder%"=="" (
@@ -73,6 +73,8 @@ if "%input_subfolder%"=="" (
     GOTO :end
 )
 
+if /I "%input_subfolder%"=="all" GOTO :run_all
+
 ECHO.
 ECHO ========================================================
 ECHO  Running script for subfolder: %input_subfolder%
@@ -81,6 +83,28 @@ ECHO.
 
 :: Execute the Python script.
 python gtfs_splitter.py ".\%input_subfolder%"
+GOTO :finished
+
+:run_all
+:: Split every subfolder holding a Process_GTFS_Filter.json, several at once.
+set "worker_count=1"
+set /p "worker_count=Number of subfolders to process in parallel [1]: "
+
+ECHO.
+ECHO ========================================================
+ECHO  Running script for all subfolders (%worker_count% worker(s))
+ECHO ========================================================
+ECHO.
+
+python gtfs_splitter.py --all --workers %worker_count%
+
+:finished
+if %errorlevel% neq 0 (
+    ECHO.
+    ECHO ####################################################################
+    ECHO ## ERROR: One or more splits failed. See the messages above.
+    ECHO ####################################################################
+)
 
 ECHO.
 ECHO ========================================================
@@ -0,0 +1,269 @@
+#### Stop ID remapper
+# Replaces the stop IDs of the GTFS files listed in matched_files_with_stop_id_columns.csv
+# with the IDs of MBTA_Stopid_lookup_updated.csv, as the "Replace STOP ids" step of
+# 1--gtfs_file_data_updater.ipynb, and writes the same stopid_update_log.txt.
+#
+# The lookup is loaded once into a dict. Each file's stop ID columns are first read
+# alone as categoricals, so IDs are looked up once per distinct value rather than once
+# per row, and files without changes are left untouched. Files that change are
+# rewritten in chunks (stop_times.txt never has to fit in memory), with every other
+# value kept as its original text: files without quoted values line by line, others
+# through pandas. Files are processed in parallel.
+#
+# Usage (from this folder):
+#     python gtfs_stopid_remapper.py "../4--Updated_GTFS_Files" --workers 4
+
+import os
+import sys
+import mmap
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MATCHED_FILES_CSV = os.path.join(SCRIPT_DIR, '..', 'step-1_Stopid_Processor',
+                                         'matched_files_with_stop_id_columns.csv')
+DEFAULT_LOOKUP_CSV = os.path.join(SCRIPT_DIR, '..', 'step-1_Stopid_Processor', 'MBTA_Stopid_lookup_updated.csv')
+DEFAULT_LOG_FILE = os.path.join(SCRIPT_DIR, 'stopid_update_log.txt')
+# Rows per chunk when rewriting a file.
+DEFAULT_CHUNK_ROWS = 500000
+# Every value is read as text, with empty values kept as '' rather than NaN.
+CSV_OPTIONS = {'keep_default_na': False, 'encoding': 'utf-8-sig'}
+
+
+def load_stop_id_lookup(lookup_csv):
+    """
+    Loads the stop ID lookup as a dict of old -> new stop ID.
+
+    Uses the 'stop_id' and 'stop_id_update' columns, or else the 2nd and 6th
+    columns. Rows without a new ID are left out, so those IDs stay unchanged.
+
+    Args:
+        lookup_csv (str): Path of MBTA_Stopid_lookup_updated.csv.
+
+    Returns:
+        dict: New stop ID by old stop ID.
+    """
+    lookup_df = pd.read_csv(lookup_csv, dtype=str, **CSV_OPTIONS)
+    if 'stop_id' in lookup_df.columns and 'stop_id_update' in lookup_df.columns:
+        old_ids, new_ids = lookup_df['stop_id'], lookup_df['stop_id_update']
+    else:
+        old_ids, new_ids = lookup_df.iloc[:, 1], lookup_df.iloc[:, 5]
+    # Later rows win over earlier ones for the same old ID.
+    return {old: new for old, new in zip(old_ids, new_ids) if old != '' and new != ''}
+
+
+def load_matched_files(matched_files_csv):
+    """
+    Returns the files to update as a list of (file name, [stop ID columns]),
+    from the 'file_name' and comma-separated 'stop_id_columns' columns.
+    """
+    matched_files_df = pd.read_csv(matched_files_csv, dtype=str, **CSV_OPTIONS)
+    return [(row['file_name'], [col.strip() for col in row['stop_id_columns'].split(',')])
+            for _, row in matched_files_df.iterrows()]
+
+
+def _remap_categories(categories, mapping):
+    """New value of each category: its mapped stop ID, or itself when not in the lookup."""
+    return np.array([mapping.get(value, value) for value in categories], dtype=object)
+
+
+def _change_summary(old_ids, new_ids):
+    """The notebook's table of unique (old, new) pairs, sorted by old ID."""
+    changes = pd.DataFrame({'old': old_ids, 'new': new_ids})
+    return changes.sort_values(by='old').to_string(index=False)
+
+
+def _has_quotes(file_path):
+    """True if the file holds a double quote, i.e. may have quoted CSV values."""
+    if not os.path.getsize(file_path):
+        return False
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return data.find(b'"') >= 0
+
+
+def _rewrite_lines(file_path, output_file, positions, replacements, block_bytes):
+    """
+    Rewrites a file without quoted values by splitting each line only up to the
+    last stop ID column. Everything else, line endings included, is copied as it is.
+    """
+    last = max(positions)
+    with open(file_path, 'r', newline='', encoding='utf-8-sig') as input_file:
+        output_file.write(input_file.readline())
+        while True:
+            lines = input_file.readlines(block_bytes)
+            if not lines:
+                break
+            out = []
+            for line in lines:
+                parts = line.split(',', last + 1)
+                if len(parts) <= last:
+                    out.append(line)
+                    continue
+                eol = ''
+                if len(parts) == last + 1:
+                    # The last stop ID column ends the line.
+                    value = parts[last].rstrip('\r\n')
+                    eol = parts[last][len(value):]
+                    parts[last] = value
+                for position, replacement in zip(positions, replacements):
+                    parts[position] = replacement.get(parts[position], parts[position])
+                out.append(','.join(parts) + eol)
+            output_file.write(''.join(out))
+
+
+def _rewrite_chunks(file_path, output_file, new_categories, chunk_rows):
+    """Rewrites a file in pandas chunks, replacing stop IDs through their categories' new values."""
+    dtypes = {col: pd.CategoricalDtype(categories) for col, (categories, _) in new_categories.items()}
+    header = True
+    for chunk in pd.read_csv(file_path, dtype=str, chunksize=chunk_rows, **CSV_OPTIONS):
+        for col, dtype in dtypes.items():
+            codes = chunk[col].astype(dtype).cat.codes.to_numpy()
+            # Values missing from the categories (code -1) are kept as they are.
+            chunk[col] = np.where(codes >= 0, new_categories[col][1][codes], chunk[col].to_numpy(dtype=object))
+        chunk.to_csv(output_file, index=False, header=header)
+        header = False
+
+
+def _rewrite_file(file_path, columns, new_categories, chunk_rows):
+    """
+    Rewrites a file with the changed stop ID categories replaced. The file is
+    replaced only once fully written.
+    """
+    tmp_path = file_path + '.tmp'
+    try:
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as output_file:
+            if _has_quotes(file_path):
+                _rewrite_chunks(file_path, output_file, new_categories, chunk_rows)
+            else:
+                positions = [columns.index(col) for col in new_categories]
+                # Only the changed IDs are looked up.
+                replacements = [{old: new for old, new in zip(categories, new_values) if old != new}
+                                for categories, new_values in new_categories.values()]
+                # About chunk_rows lines per block, at ~64 bytes a line.
+                _rewrite_lines(file_path, output_file, positions, replacements, max(1, chunk_rows) * 64)
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def remap_file(gtfs_dir, file_name, stop_id_columns, mapping, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Replaces the stop IDs of one GTFS file in place.
+
+    Args:
+        gtfs_dir (str): Folder holding the GTFS files.
+        file_name (str): File to update, e.g. 'stop_times.txt'.
+        stop_id_columns (list): Columns holding stop IDs.
+        mapping (dict): New stop ID by old stop ID.
+        chunk_rows (int): Rows per chunk when the file is rewritten.
+
+    Returns:
+        list: The file's lines of the update log.
+    """
+    file_path = os.path.join(gtfs_dir, file_name)
+    if not os.path.exists(file_path):
+        return [f"File '{file_path}' not found. Skipping.\n"]
+
+    log_lines = [f"\nProcessing file: {file_name}\n"]
+    columns = list(pd.read_csv(file_path, nrows=0, **CSV_OPTIONS).columns)
+    found_columns = [col for col in stop_id_columns if col in columns]
+    stop_ids = pd.read_csv(file_path, usecols=found_columns, dtype='category', **CSV_OPTIONS) \
+        if found_columns else None
+
+    new_categories = {}
+    for col in stop_id_columns:
+        if col not in columns:
+            log_lines.append(f"Column '{col}' not found in '{file_name}'.\n")
+            continue
+        values = stop_ids[col].cat
+        categories = np.asarray(values.categories, dtype=object)
+        new_values = _remap_categories(categories, mapping)
+        changed = categories != new_values
+        codes = values.codes.to_numpy()
+        changed_count = int(np.bincount(codes[codes >= 0], minlength=len(categories))[changed].sum())
+        if changed_count > 0:
+            new_categories[col] = (categories, new_values)
+            log_lines.append(f"In column '{col}': {changed_count} rows changed.\n")
+            log_lines.append(_change_summary(categories[changed], new_values[changed]) + "\n")
+        else:
+            log_lines.append(f"In column '{col}': no changes made.\n")
+
+    if new_categories:
+        _rewrite_file(file_path, columns, new_categories, chunk_rows)
+        log_lines.append(f"File '{file_name}' updated and saved successfully.\n")
+    else:
+        log_lines.append(f"No updates made to '{file_name}'.\n")
+    return log_lines
+
+
+def remap_stop_ids(gtfs_dir, matched_files_csv=DEFAULT_MATCHED_FILES_CSV, lookup_csv=DEFAULT_LOOKUP_CSV,
+                   log_file_path=DEFAULT_LOG_FILE, max_workers=1, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Replaces the stop IDs of every file listed in the matched files CSV and
+    writes the update log, in the order of the list.
+
+    Args:
+        gtfs_dir (str): Folder holding the GTFS files, updated in place.
+        matched_files_csv (str): Path of matched_files_with_stop_id_columns.csv.
+        lookup_csv (str): Path of MBTA_Stopid_lookup_updated.csv.
+        log_file_path (str): Path of the update log to write.
+        max_workers (int): Files processed in parallel.
+        chunk_rows (int): Rows per chunk when a file is rewritten.
+
+    Returns:
+        bool: True if every file was processed.
+    """
+    matched_files = load_matched_files(matched_files_csv)
+    print(f"Loaded '{matched_files_csv}' with {len(matched_files)} entries.")
+    mapping = load_stop_id_lookup(lookup_csv)
+    print(f"Loaded '{lookup_csv}' with {len(mapping)} stop ID updates.")
+
+    results = [None] * len(matched_files)
+    if max_workers > 1 and len(matched_files) > 1:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(matched_files))) as executor:
+            futures = [executor.submit(remap_file, gtfs_dir, file_name, columns, mapping, chunk_rows)
+                       for file_name, columns in matched_files]
+            for position, future in enumerate(futures):
+                try:
+                    results[position] = future.result()
+                except Exception as e:
+                    results[position] = e
+    else:
+        for position, (file_name, columns) in enumerate(matched_files):
+            try:
+                results[position] = remap_file(gtfs_dir, file_name, columns, mapping, chunk_rows)
+            except Exception as e:
+                results[position] = e
+
+    success = True
+    log_lines = ["Stop ID Update Log\n", "=" * 60 + "\n"]
+    for (file_name, _), result in zip(matched_files, results):
+        if isinstance(result, Exception):
+            print(f"Error: Could not update '{file_name}': {result}")
+            log_lines.append(f"\nError updating '{file_name}': {result}\n")
+            success = False
+        else:
+            log_lines.extend(result)
+    with open(log_file_path, "w") as f:
+        f.writelines(log_lines)
+    print(f"Stop ID update log created at '{log_file_path}'.")
+    return success
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replace GTFS stop IDs using the updated MBTA stop ID lookup.")
+    parser.add_argument("gtfs_dir", help="Folder of GTFS files to update in place.")
+    parser.add_argument("--matched-files", default=DEFAULT_MATCHED_FILES_CSV,
+                        help="CSV of files and their stop ID columns (default: step-1 matched_files_with_stop_id_columns.csv).")
+    parser.add_argument("--lookup", default=DEFAULT_LOOKUP_CSV,
+                        help="Stop ID lookup CSV (default: step-1 MBTA_Stopid_lookup_updated.csv).")
+    parser.add_argument("--log", default=DEFAULT_LOG_FILE, help="Update log to write (default: stopid_update_log.txt here).")
+    parser.add_argument("--workers", type=int, default=1, help="Files processed in parallel.")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per chunk when rewriting a file.")
+    args = parser.parse_args()
+    ok = remap_stop_ids(args.gtfs_dir, args.matched_files, args.lookup, args.log, max(1, args.workers), args.chunk_rows)
+    sys.exit(0 if ok else 1)
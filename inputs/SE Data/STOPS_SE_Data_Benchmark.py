@@ -0,0 +1,295 @@
+#### Benchmark harness for STOPS_SE_Data_Pipeline.py
+# Generates a synthetic baseline DBF and UrbanSim/NHRI-shaped CSVs, writes a matching
+# pipeline_config.json and runs the pipeline on it, writing per-phase times (read,
+# aggregate, merge, write), memory and throughput to a JSON report, so runtimes can
+# be compared between code versions without the real J: drive data.
+
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from STOPS_SE_Data_Pipeline import (
+    PhaseProfile, SourceCache, preload_sources, process_run_mode, write_dbf,
+)
+
+DEFAULT_REPORT_FILE = 'se_benchmark_report.json'
+FIRST_YEAR = 2019
+YEAR_STEP = 5
+# Share of source rows whose zone is missing from the baseline, as in the real data.
+UNMATCHED_FRACTION = 0.01
+
+
+def generate_baseline_dbf(path, n_zones, seed):
+    """
+    Writes a baseline DBF in the layout of MPO1126TAZPopEmp.dbf: TAZ_ID, a town
+    name, the area and the 2010 population and employment of each zone.
+    """
+    rng = np.random.default_rng(seed)
+    towns = np.array([f"TOWN{i:03d}" for i in range(max(1, n_zones // 20))], dtype=object)
+    write_dbf(pd.DataFrame({
+        'TAZ_ID': np.arange(1, n_zones + 1, dtype=np.int64),
+        'TOWN': towns[rng.integers(0, len(towns), n_zones)],
+        'AREA_SQMI': rng.random(n_zones) * 5,
+        'POP2010': rng.integers(0, 5000, n_zones),
+        'EMP2010': rng.integers(0, 3000, n_zones),
+    }), path)
+
+
+def _zone_ids(rng, n_rows, n_zones):
+    """Random zone IDs, UNMATCHED_FRACTION of them beyond the baseline zones."""
+    zones = rng.integers(1, n_zones + 1, n_rows)
+    unmatched = rng.random(n_rows) < UNMATCHED_FRACTION
+    zones[unmatched] += n_zones
+    return zones
+
+
+def generate_population_csv(path, n_zones, n_persons, seed, block_rows=1_000_000):
+    """Writes one row per person (person_id, block_id, age), as in the UrbanSim files."""
+    rng = np.random.default_rng(seed)
+    for row_start in range(0, n_persons, block_rows):
+        row_end = min(row_start + block_rows, n_persons)
+        pd.DataFrame({
+            'person_id': np.arange(row_start, row_end),
+            'block_id': _zone_ids(rng, row_end - row_start, n_zones),
+            'age': rng.integers(0, 95, row_end - row_start),
+        }).to_csv(path, mode='w' if row_start == 0 else 'a', header=row_start == 0, index=False)
+
+
+def generate_employment_csv(path, n_zones, n_jobs, seed, block_rows=1_000_000):
+    """Writes establishment rows (block_id, sector, total_jobs) adding up to about n_jobs jobs."""
+    rng = np.random.default_rng(seed)
+    n_rows = max(1, n_jobs // 10)
+    for row_start in range(0, n_rows, block_rows):
+        row_end = min(row_start + block_rows, n_rows)
+        pd.DataFrame({
+            'block_id': _zone_ids(rng, row_end - row_start, n_zones),
+            'sector': rng.integers(0, 20, row_end - row_start),
+            'total_jobs': rng.integers(1, 20, row_end - row_start),
+        }).to_csv(path, mode='w' if row_start == 0 else 'a', header=row_start == 0, index=False)
+
+
+def prepare_case(work_dir, n_zones, n_persons, n_jobs, n_years, n_sources, seed):
+    """
+    Generates the inputs for one scale, mirroring the shipped configuration: a
+    population and employment file per year from UrbanSim, plus n_sources - 1
+    NHRI-like files (a tenth of the size) shared by every year.
+
+    Returns:
+        dict: Paths of the generated files and the number of distinct source rows.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    print(f"Generating synthetic inputs for {n_zones:,} zones, {n_persons:,} persons and "
+          f"{n_jobs:,} jobs per year in {work_dir}...")
+    baseline_path = os.path.join(work_dir, 'Baseline_TAZPopEmp.dbf')
+    generate_baseline_dbf(baseline_path, n_zones, seed)
+
+    shared = []
+    for source in range(1, n_sources):
+        pop_path = os.path.join(work_dir, f"nhri_population_{source}.csv")
+        emp_path = os.path.join(work_dir, f"nhri_employment_{source}.csv")
+        generate_population_csv(pop_path, n_zones, n_persons // 10, seed + 1000 + source)
+        generate_employment_csv(emp_path, n_zones, n_jobs // 10, seed + 2000 + source)
+        shared.append({'pop_csv': pop_path, 'emp_csv': emp_path})
+
+    years = []
+    for index in range(n_years):
+        year = FIRST_YEAR + YEAR_STEP * index
+        pop_path = os.path.join(work_dir, f"tazleveldata_population_{year}.csv")
+        emp_path = os.path.join(work_dir, f"tazleveldata_employment_{year}.csv")
+        generate_population_csv(pop_path, n_zones, n_persons, seed + year)
+        generate_employment_csv(emp_path, n_zones, n_jobs, seed + year + 1)
+        years.append({'year': year, 'sources': [{'pop_csv': pop_path, 'emp_csv': emp_path}] + shared})
+
+    source_rows = n_years * (n_persons + n_jobs // 10) + (n_sources - 1) * (n_persons // 10 + n_jobs // 100)
+    return {'baseline_path': baseline_path, 'years': years, 'source_rows': source_rows}
+
+
+def write_config(work_dir, case, settings):
+    """Writes a pipeline_config.json for the case and returns its path."""
+    config = {
+        'source_cache_dir': os.path.join(work_dir, 'Pipeline Cache'),
+        'source_chunk_rows': settings.get('source_chunk_rows', 1_000_000),
+        'csv_engine': settings.get('csv_engine', 'c'),
+        'data_processing_runs': [{
+            'run_mode': 'Benchmark',
+            'baseline_dbf_file': case['baseline_path'],
+            'output_file': os.path.join(work_dir, 'output', 'TAZPopEmp-Benchmark.dbf'),
+            'join_key_master': 'TAZ_ID',
+            'join_key_csv': 'block_id',
+            'data_sets': [
+                {
+                    'year': year['year'],
+                    'pop_col_name': f"POP{year['year']}",
+                    'emp_col_name': f"EMP{year['year']}",
+                    'sources': [
+                        {
+                            'pop_csv': source['pop_csv'],
+                            'pop_agg_method': 'size',
+                            'emp_csv': source['emp_csv'],
+                            'emp_value_col': 'total_jobs',
+                        }
+                        for source in year['sources']
+                    ],
+                }
+                for year in case['years']
+            ],
+        }],
+    }
+    config_path = os.path.join(work_dir, 'pipeline_config.json')
+    with open(config_path, 'w') as f:
+        json.dump(config, f, indent=4)
+    return config_path
+
+
+def run_case(config_path, settings, n_source_rows):
+    """
+    Runs the pipeline on a prepared configuration and returns its phase times
+    and memory, cache use and source throughput.
+    """
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+    run_config = config['data_processing_runs'][0]
+    script_dir = Path(config_path).resolve().parent
+    profile = PhaseProfile(trace_memory=settings.get('trace_memory', True))
+    cache_dir = config['source_cache_dir'] if settings.get('use_cache', True) else None
+    source_cache = SourceCache(cache_dir)
+
+    start_time = time.time()
+    workers = settings.get('workers', 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor, profile.phase('aggregate'):
+            preload_sources([run_config], config, script_dir, source_cache, executor)
+    process_run_mode(run_config, config, script_dir, source_cache, profile=profile)
+    wall_seconds = time.time() - start_time
+
+    aggregate_seconds = profile.seconds.get('aggregate') or 0.0
+    return {
+        'wall_seconds': round(wall_seconds, 3),
+        'phase_seconds': {phase: round(seconds, 3) for phase, seconds in profile.seconds.items()},
+        'phase_peak_mb': {phase: round(peak_mb, 1) for phase, peak_mb in profile.peak_mb.items()},
+        'output_bytes': os.path.getsize(run_config['output_file']),
+        'cache_hits': source_cache.hits,
+        'cache_misses': source_cache.misses,
+        'source_rows_per_second': (
+            round(n_source_rows / aggregate_seconds) if aggregate_seconds and source_cache.misses else None
+        ),
+    }
+
+
+def run_benchmarks(scales, settings_list, report_path, seed=0, work_root=None, keep=False):
+    """
+    Benchmarks every input scale against every pipeline settings variant.
+
+    Variants that use the source cache are run twice on the same inputs: a cold
+    run that aggregates every CSV, then a warm run that finds them in the cache.
+
+    Args:
+        scales (list): Dicts with 'zones', 'persons', 'jobs', 'years' and 'sources'.
+        settings_list (list): Dicts of settings to compare ('workers', 'use_cache',
+            'csv_engine', 'source_chunk_rows', 'trace_memory').
+        report_path (str): JSON file the results are written to.
+        seed (int): Seed for the synthetic data.
+        work_root (str, optional): Directory for generated inputs (a temp dir by default).
+        keep (bool): Keep the generated inputs instead of deleting them.
+
+    Returns:
+        dict: The report written to report_path.
+    """
+    work_root = work_root or tempfile.mkdtemp(prefix='se_benchmark_')
+    record = {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'cpu_count': os.cpu_count(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'results': [],
+    }
+    try:
+        for scale in scales:
+            case_dir = os.path.join(work_root, f"zones_{scale['zones']}_persons_{scale['persons']}")
+            case = prepare_case(case_dir, scale['zones'], scale['persons'], scale['jobs'],
+                                scale['years'], scale['sources'], seed)
+            for settings in settings_list:
+                config_path = write_config(case_dir, case, settings)
+                # Start each variant cold: no cached aggregates or previous output.
+                for stale in ('Pipeline Cache', 'output'):
+                    shutil.rmtree(os.path.join(case_dir, stale), ignore_errors=True)
+                runs = ('cold', 'warm') if settings.get('use_cache', True) else ('cold',)
+                for run in runs:
+                    print(f"\n=== {scale}, {settings}, {run} run ===")
+                    result = run_case(config_path, settings, case['source_rows'])
+                    result.update({'scale': scale, 'settings': settings, 'run': run})
+                    record['results'].append(result)
+    finally:
+        if not keep:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    with open(report_path, 'w') as f:
+        json.dump(record, f, indent=2)
+    print_summary(record)
+    print(f"\nResults written to {report_path}")
+    return record
+
+
+def print_summary(record):
+    """Prints one line per benchmark result."""
+    print("\n--- Benchmark Summary ---")
+    for result in record['results']:
+        phases = ', '.join(
+            f"{phase} {seconds:.2f}s"
+            + (f"/{result['phase_peak_mb'][phase]:,.0f} MB" if phase in result['phase_peak_mb'] else '')
+            for phase, seconds in result['phase_seconds'].items()
+        )
+        scale = result['scale']
+        print(f"{scale['zones']:>7,} zones {scale['persons']:>11,} persons {result['run']:>4} "
+              f"{json.dumps(result['settings'])}: {result['wall_seconds']:.2f}s ({phases})")
+
+
+def main():
+    """Parses command line arguments and runs the benchmarks."""
+    parser = argparse.ArgumentParser(description="Benchmark STOPS_SE_Data_Pipeline on synthetic SE data.")
+    parser.add_argument("--zones", type=int, nargs='+', default=[5000], help="Zone counts to benchmark.")
+    parser.add_argument("--persons", type=int, nargs='+', default=[1_000_000],
+                        help="Persons per year in the UrbanSim population files.")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Jobs per year in the employment files (half the persons by default).")
+    parser.add_argument("--years", type=int, default=3, help="Years (data sets) in the run mode.")
+    parser.add_argument("--sources", type=int, default=2,
+                        help="Sources per year: one UrbanSim source plus shared NHRI-like sources.")
+    parser.add_argument("--workers", type=int, nargs='+', default=[1], help="Worker counts to compare.")
+    parser.add_argument("--engines", nargs='+', default=['c'], choices=['c', 'pyarrow'],
+                        help="CSV engines to compare.")
+    parser.add_argument("--no-cache", action='store_true', help="Run without the source cache (cold runs only).")
+    parser.add_argument("--no-trace-memory", action='store_true',
+                        help="Do not trace per-phase memory (tracing slows the pipeline down).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic data.")
+    parser.add_argument("--report", default=DEFAULT_REPORT_FILE, help="JSON report file to write.")
+    parser.add_argument("--work-dir", default=None, help="Directory for generated inputs.")
+    parser.add_argument("--keep", action='store_true', help="Keep the generated inputs.")
+    args = parser.parse_args()
+
+    scales = [
+        {'zones': zones, 'persons': persons, 'jobs': args.jobs if args.jobs is not None else persons // 2,
+         'years': args.years, 'sources': max(1, args.sources)}
+        for zones in args.zones for persons in args.persons
+    ]
+    settings_list = [
+        {'workers': workers, 'csv_engine': engine, 'use_cache': not args.no_cache,
+         'trace_memory': not args.no_trace_memory}
+        for engine in args.engines for workers in args.workers
+    ]
+    run_benchmarks(scales, settings_list, args.report, args.seed, args.work_dir, args.keep)
+
+
+if __name__ == '__main__':
+    main()
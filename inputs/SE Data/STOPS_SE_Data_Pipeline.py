@@ -1,10 +1,23 @@
 import pandas as pd
+import numpy as np
 import os
 import json
+import struct
+import datetime
+import hashlib
+import time
 import argparse
+import contextlib
+import tracemalloc
 from dbfread import DBF
-import dbf
+from dbfread.codepages import guess_encoding
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import scipy.sparse as sparse
+except ImportError:  # Crosswalks are then applied with numpy alone.
+    sparse = None
 
 def resolve_path(path_template, config, script_dir):
     """
@@ -24,6 +37,307 @@ def resolve_path(path_template, config, script_dir):
     return path_obj
 
 
+# dBASE III field layout written for each pandas dtype: (type, length, decimals).
+DBF_INTEGER_FIELD = ('N', 18, 0)
+DBF_FLOAT_FIELD = ('F', 19, 8)
+DBF_DATE_FIELD = ('D', 8, 0)
+DBF_LOGICAL_FIELD = ('L', 1, 0)
+DBF_CHARACTER_FIELD = ('C', 254, 0)
+# Code page mark for UTF-8, as written by the dbf package with codepage='utf8'.
+DBF_UTF8_CODEPAGE = 0xF0
+
+
+def _dbf_encoding(language_driver):
+    """Returns the text encoding for a DBF language driver byte, as dbfread guesses it."""
+    if language_driver == DBF_UTF8_CODEPAGE:
+        return 'utf-8'
+    try:
+        return guess_encoding(language_driver)
+    except LookupError:
+        return 'ascii'
+
+
+def _parse_dbf_numbers(raw, field_type):
+    """
+    Converts N/F field bytes column-wise, with dbfread's rules: integer text in an
+    N field gives an int column, anything else floats, and blank fields NaN.
+    """
+    stripped = np.char.strip(np.char.strip(raw), b'*')
+    blank = stripped == b''
+    if field_type == 'N' and not blank.any():
+        try:
+            return stripped.astype(np.int64)
+        except (ValueError, OverflowError):
+            pass
+    values = np.full(len(raw), np.nan)
+    values[~blank] = np.char.replace(stripped[~blank], b',', b'.').astype(np.float64)
+    return values
+
+
+def _parse_dbf_dates(raw):
+    """Converts D field bytes to datetime.date objects, None for blank dates."""
+    values = []
+    for data in raw.tolist():
+        if data.strip(b' 0') == b'':
+            values.append(None)
+        else:
+            values.append(datetime.date(int(data[:4]), int(data[4:6]), int(data[6:8])))
+    return np.array(values, dtype=object)
+
+
+def _parse_dbf_logicals(raw):
+    """Converts L field bytes to booleans, None (object column) for unknown values."""
+    true = np.isin(raw, [b'T', b't', b'Y', b'y'])
+    unknown = np.isin(raw, [b'?', b' ', b''])
+    if not unknown.any():
+        return true
+    values = true.astype(object)
+    values[unknown] = None
+    return values
+
+
+def read_dbf(dbf_path, columns=None, lowernames=True, encoding=None):
+    """
+    Reads a DBF file column by column instead of record by record.
+
+    The header is parsed directly and the record area memory-mapped as a NumPy
+    structured array, so each field is a fixed-width byte column converted in one
+    vectorized step. Values and dtypes match pd.DataFrame(iter(DBF(dbf_path))):
+    deleted records are skipped, N fields become int (or float when they hold
+    decimals or blanks), F fields float, C fields stripped text, D fields
+    datetime.date and L fields bool. Files with other field types (memo, binary)
+    are read with dbfread instead.
+
+    Args:
+        dbf_path (str or Path): The DBF file.
+        columns (list, optional): Only load these columns (names as returned).
+        lowernames (bool): Lower-case the field names, like dbfread's lowernames.
+        encoding (str, optional): Text encoding; guessed from the header by default.
+
+    Returns:
+        pd.DataFrame: The table.
+    """
+    with open(dbf_path, 'rb') as f:
+        header = f.read(32)
+        _, n_records, header_length, record_length = struct.unpack('<B3xIHH', header[:12])
+        language_driver = header[29]
+        fields = []
+        while True:
+            descriptor = f.read(32)
+            if len(descriptor) < 32 or descriptor[:1] in (b'\r', b'\n'):
+                break
+            name = descriptor[:11].split(b'\0')[0].decode('ascii')
+            fields.append((name.lower() if lowernames else name, chr(descriptor[11]), descriptor[16], descriptor[17]))
+        file_size = os.fstat(f.fileno()).st_size
+
+    field_names = [name for name, _, _, _ in fields]
+    columns = field_names if columns is None else list(columns)
+    missing = [col for col in columns if col not in field_names]
+    if missing:
+        raise KeyError(f"Columns {missing} not found in {dbf_path}.")
+
+    supported = all(field_type in 'CNFDL' for _, field_type, _, _ in fields)
+    if not supported or 1 + sum(length for _, _, length, _ in fields) != record_length:
+        records = pd.DataFrame(iter(DBF(dbf_path, lowernames=lowernames, encoding=encoding)))
+        return records[columns] if len(records.columns) else pd.DataFrame(columns=columns)
+
+    encoding = encoding or _dbf_encoding(language_driver)
+    n_stored = max(0, min(n_records, (file_size - header_length) // record_length)) if record_length else 0
+    formats = [('_flag', 'S1')] + [(f"f{index}", f'S{length}') for index, (_, _, length, _) in enumerate(fields)]
+    if n_stored:
+        records = np.memmap(dbf_path, dtype=np.dtype(formats), mode='r', offset=header_length, shape=(n_stored,))
+    else:
+        records = np.zeros(0, dtype=np.dtype(formats))
+    # Like dbfread, stop at the end-of-file marker and skip deleted records.
+    flags = records['_flag']
+    end = np.flatnonzero(flags == b'\x1a')
+    keep = np.flatnonzero(flags[:end[0] if len(end) else len(flags)] == b' ')
+
+    data = {}
+    for index, (name, field_type, _, _) in enumerate(fields):
+        if name not in columns:
+            continue
+        raw = np.asarray(records[f"f{index}"])[keep]
+        if field_type in ('N', 'F'):
+            data[name] = _parse_dbf_numbers(raw, field_type)
+        elif field_type == 'D':
+            data[name] = _parse_dbf_dates(raw)
+        elif field_type == 'L':
+            data[name] = _parse_dbf_logicals(raw)
+        else:
+            data[name] = np.char.decode(np.char.rstrip(raw, b'\0 '), encoding)
+    return pd.DataFrame(data, columns=columns)
+
+
+def _dbf_field_spec(dtype):
+    """Returns the (type, length, decimals) of the DBF field used for a pandas dtype."""
+    if pd.api.types.is_integer_dtype(dtype): return DBF_INTEGER_FIELD
+    elif pd.api.types.is_float_dtype(dtype): return DBF_FLOAT_FIELD
+    elif pd.api.types.is_datetime64_any_dtype(dtype): return DBF_DATE_FIELD
+    elif pd.api.types.is_bool_dtype(dtype): return DBF_LOGICAL_FIELD
+    else: return DBF_CHARACTER_FIELD
+
+
+def _digit_matrix(magnitudes, n_digits):
+    """Renders non-negative integers as zero-padded ASCII digits, one row of n_digits bytes per value."""
+    digits = np.empty((len(magnitudes), n_digits), dtype=np.uint8)
+    remaining = magnitudes.astype(np.int64)
+    for position in range(n_digits - 1, -1, -1):
+        digits[:, position] = remaining % 10 + ord('0')
+        remaining //= 10
+    return digits
+
+
+def _encode_dbf_numbers(values, length, decimals):
+    """
+    Encodes a numeric column as right-aligned '%{length}.{decimals}f' text, the way the
+    dbf package writes N and F fields (integers are converted to float first, as it does).
+    Missing values become blanks.
+
+    Args:
+        values (np.ndarray): Column values as float64, NaN for missing.
+        length (int): Field length.
+        decimals (int): Number of decimals.
+
+    Returns:
+        np.ndarray: A (rows, length) uint8 array of field bytes.
+    """
+    missing = np.isnan(values)
+    if np.isinf(values).any():
+        raise ValueError("infinite values cannot be stored in a numeric field")
+    magnitudes = np.where(missing, 0.0, np.abs(values))
+    int_part = np.floor(magnitudes)
+    int_width = length - (decimals + 1 if decimals else 0)
+    ambiguous = np.zeros(len(values), dtype=bool)
+    if decimals:
+        scale = 10 ** decimals
+        scaled_fraction = (magnitudes - int_part) * scale
+        fraction = np.rint(scaled_fraction)
+        # The scaled fraction is inexact, so values within a hair of a rounding tie
+        # are formatted with Python below to round exactly like printf.
+        ambiguous = ~missing & (np.abs(scaled_fraction - np.floor(scaled_fraction) - 0.5) < 1e-6)
+        carry = fraction >= scale
+        int_part[carry] += 1
+        fraction[carry] = 0
+    else:
+        int_part = np.rint(magnitudes)
+
+    negative = np.signbit(values) & ~missing
+    if len(values) and int_part.max() >= 10.0 ** int_width:
+        raise ValueError(f"value {values[np.argmax(int_part)]} is too large for a {length}-character field")
+    int_lengths = np.ones(len(values), dtype=np.int64)
+    for power in range(1, int_width):
+        int_lengths += int_part >= 10.0 ** power
+    too_long = int_lengths + negative > int_width
+    if too_long.any():
+        raise ValueError(f"value {values[np.argmax(too_long)]} is too large for a {length}-character field")
+
+    chars = np.full((len(values), length), ord(' '), dtype=np.uint8)
+    int_digits = _digit_matrix(int_part, int_width)
+    significant = np.arange(int_width) >= (int_width - int_lengths)[:, None]
+    chars[:, :int_width] = np.where(significant, int_digits, ord(' '))
+    rows = np.flatnonzero(negative)
+    chars[rows, int_width - 1 - int_lengths[rows]] = ord('-')
+    if decimals:
+        chars[:, int_width] = ord('.')
+        chars[:, int_width + 1:] = _digit_matrix(fraction, decimals)
+    chars[missing] = ord(' ')
+    for row in np.flatnonzero(ambiguous):
+        chars[row] = np.frombuffer(('%*.*f' % (length, decimals, values[row])).encode('ascii'), dtype=np.uint8)
+    return chars
+
+
+def _encode_dbf_dates(series):
+    """Encodes a datetime column as YYYYMMDD, blank for missing dates."""
+    if getattr(series.dt, 'tz', None) is not None:
+        series = series.dt.tz_localize(None)
+    days = series.to_numpy(dtype='datetime64[D]')
+    missing = np.isnat(days)
+    years = days.astype('datetime64[Y]')
+    months = days.astype('datetime64[M]')
+    year = years.astype(np.int64) + 1970
+    month = (months - years).astype(np.int64) + 1
+    day = (days - months).astype(np.int64) + 1
+    chars = _digit_matrix(np.where(missing, 0, year * 10000 + month * 100 + day), 8)
+    chars[missing] = ord(' ')
+    return chars
+
+
+def _encode_dbf_logicals(series):
+    """Encodes a boolean column as T/F, '?' for missing values."""
+    chars = np.full((len(series), 1), ord('?'), dtype=np.uint8)
+    present = series.notna().to_numpy()
+    flags = series.to_numpy(dtype=object)[present].astype(bool)
+    chars[present, 0] = np.where(flags, ord('T'), ord('F'))
+    return chars
+
+
+def _encode_dbf_strings(series, length):
+    """Encodes a column as stripped, left-aligned UTF-8 text, blank for missing values."""
+    texts = series.astype(object).where(series.notna(), '').astype(str).to_numpy(dtype=str)
+    encoded = np.char.encode(np.char.strip(texts), 'utf-8')
+    too_long = np.char.str_len(encoded) > length
+    if too_long.any():
+        raise ValueError(f"text '{texts[np.argmax(too_long)][:40]}...' is longer than {length} bytes")
+    chars = encoded.astype(f'S{length}').view(np.uint8).reshape(len(series), length).copy()
+    chars[chars == 0] = ord(' ')
+    return chars
+
+
+def write_dbf(df, output_path):
+    """
+    Writes a DataFrame to a dBASE III file in bulk: every column is encoded into a
+    fixed-width byte array with NumPy and the record block is written in one call.
+    The layout matches what the dbf package writes with codepage='utf8': integer
+    columns as N(18,0), float as F(19,8), datetime as D, bool as L and anything else
+    as C(254), with field names cut to 10 characters and upper-cased.
+
+    Args:
+        df (pd.DataFrame): The data to write.
+        output_path (str or Path): The DBF file to create.
+
+    Raises:
+        ValueError: If field names collide after truncation or a value does not fit its field.
+    """
+    field_names = [str(col)[:10].upper() for col in df.columns]
+    duplicates = sorted({name for name in field_names if field_names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"column names are not unique when cut to 10 characters: {duplicates}")
+
+    n_rows = len(df)
+    specs = [_dbf_field_spec(dtype) for dtype in df.dtypes]
+    record_length = 1 + sum(length for _, length, _ in specs)
+    header_length = 32 + 32 * len(specs) + 1
+
+    records = np.full((n_rows, record_length), ord(' '), dtype=np.uint8)
+    descriptors = []
+    offset = 1  # byte 0 of each record is the deletion flag
+    for (col, series), name, (field_type, length, decimals) in zip(df.items(), field_names, specs):
+        if field_type in ('N', 'F'):
+            chars = _encode_dbf_numbers(series.to_numpy(dtype=np.float64, na_value=np.nan), length, decimals)
+        elif field_type == 'D':
+            chars = _encode_dbf_dates(series)
+        elif field_type == 'L':
+            chars = _encode_dbf_logicals(series)
+        else:
+            chars = _encode_dbf_strings(series, length)
+        records[:, offset:offset + length] = chars
+        descriptors.append(
+            struct.pack('<11scIBB14x', name.encode('ascii'), field_type.encode('ascii'), offset, length, decimals)
+        )
+        offset += length
+
+    today = datetime.date.today()
+    header = struct.pack(
+        '<B3BIHH17xB2x', 0x03, today.year - 1900, today.month, today.day,
+        n_rows, header_length, record_length, DBF_UTF8_CODEPAGE,
+    )
+    with open(output_path, 'wb') as f:
+        f.write(header + b''.join(descriptors) + b'\r')
+        f.write(memoryview(records).cast('B'))
+        f.write(b'\x1a')
+
+
 def save_dataframe_to_dbf(df, output_path):
     """Saves a pandas DataFrame to a DBF file, handling column types and name lengths."""
     print(f"\nSaving final output to: {output_path}")
@@ -32,111 +346,730 @@ def save_dataframe_to_dbf(df, output_path):
         os.makedirs(output_dir)
         print(f"-> Created output directory: {output_dir}")
     try:
-        df_for_dbf = df.copy()
-        df_for_dbf.columns = [col[:10] for col in df.columns]
-        field_specs = []
-        for col, dtype in df_for_dbf.dtypes.items():
-            if pd.api.types.is_integer_dtype(dtype): field_specs.append(f'{col} N(18, 0)')
-            elif pd.api.types.is_float_dtype(dtype): field_specs.append(f'{col} F(19, 8)')
-            elif pd.api.types.is_datetime64_any_dtype(dtype): field_specs.append(f'{col} D')
-            elif pd.api.types.is_bool_dtype(dtype): field_specs.append(f'{col} L')
-            else: field_specs.append(f'{col} C(254)')
-        dbf_structure_string = '; '.join(field_specs)
-        table = dbf.Table(str(output_path), dbf_structure_string, codepage='utf8')
-        table.open(mode=dbf.READ_WRITE)
-        for record in df_for_dbf.to_dict('records'):
-            table.append(record)
-        table.close()
+        write_dbf(df, output_path)
         print(f"-> SUCCESS: Final DBF file with {len(df.columns)} columns saved.")
     except Exception as e:
         print(f"-> FATAL ERROR: Could not save the final DBF file: {e}")
 
-def process_run_mode(run_config, config, script_dir):
-    """Main logic to process a run mode defined in the config."""
+def _block_hid_prefix(block_hids):
+    """
+    Parses the zone key before the first '_' of block_hid values (e.g. '1234_5' -> 1234)
+    on the raw bytes of the whole column at once.
+
+    Raises:
+        ValueError: If a prefix is empty or not a whole number.
+    """
+    raw = np.asarray(block_hids, dtype=object).astype('S')
+    chars = raw.view(np.uint8).reshape(len(raw), raw.dtype.itemsize)
+    prefix_lengths = np.char.find(raw, b'_')
+    prefix_lengths = np.where(prefix_lengths < 0, np.char.str_len(raw), prefix_lengths)
+    invalid = prefix_lengths == 0
+    keys = np.zeros(len(raw), dtype=np.int64)
+    for position in range(int(prefix_lengths.max()) if len(raw) else 0):
+        active = prefix_lengths > position
+        digits = chars[:, position].astype(np.int64) - ord('0')
+        invalid |= active & ((digits < 0) | (digits > 9))
+        keys = np.where(active, keys * 10 + digits, keys)
+    if invalid.any():
+        raise ValueError(f"invalid block_hid value '{raw[np.argmax(invalid)].decode(errors='replace')}'")
+    return keys
+
+
+class _KeyAccumulator:
+    """Running per-key counts or sums, merged chunk by chunk into sorted key/total arrays."""
+
+    def __init__(self):
+        self.keys = None
+        self.totals = None
+        self.integer_totals = True
+
+    def add(self, keys, weights=None):
+        """Adds one chunk; rows with a missing key are ignored, missing weights count as 0."""
+        keys = np.asarray(keys)
+        if keys.dtype.kind == 'f':
+            present = ~np.isnan(keys)
+            keys = keys[present]
+            weights = None if weights is None else weights[present]
+        if weights is None:
+            weights = np.ones(len(keys), dtype=np.int64)
+        else:
+            if weights.dtype.kind not in 'iub':
+                self.integer_totals = False
+            weights = np.nan_to_num(weights.astype(np.float64))
+        if self.keys is not None:
+            keys = np.concatenate([self.keys, keys])
+            weights = np.concatenate([self.totals, weights])
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.totals = np.bincount(inverse.ravel(), weights=weights, minlength=len(self.keys))
+
+    def to_series(self, name):
+        """Returns the totals as a Series indexed by key, like groupby().size()/sum()."""
+        if self.keys is None:
+            return pd.Series([], dtype=np.int64, index=pd.Index([], name=name))
+        totals = self.totals.astype(np.int64) if self.integer_totals else self.totals
+        return pd.Series(totals, index=pd.Index(self.keys, name=name))
+
+
+def _iter_csv_chunks(csv_path, columns, chunk_rows, engine, string_columns=()):
+    """
+    Yields DataFrames of at most about chunk_rows rows holding only the given
+    columns, read with pandas or, when engine is 'pyarrow', with pyarrow's
+    streaming CSV reader.
+    """
+    if engine == 'pyarrow':
+        try:
+            from pyarrow import csv as pa_csv, string as pa_string
+        except ImportError:
+            print("  -> WARNING: pyarrow is not installed; reading with the pandas CSV engine.")
+        else:
+            reader = pa_csv.open_csv(
+                csv_path,
+                read_options=pa_csv.ReadOptions(block_size=64 * 1024 ** 2),
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=list(columns),
+                    column_types={col: pa_string() for col in string_columns},
+                ),
+            )
+            for batch in reader:
+                yield batch.to_pandas()
+            return
+    dtypes = {col: str for col in string_columns}
+    for chunk in pd.read_csv(csv_path, usecols=list(columns), dtype=dtypes, chunksize=chunk_rows):
+        yield chunk
+
+
+DEFAULT_SOURCE_CHUNK_ROWS = 1_000_000
+
+
+def aggregate_source(csv_path, join_key, agg_method, value_col=None, chunk_rows=1_000_000, engine='c'):
+    """
+    Reads one UrbanSim/NHRI CSV and aggregates it per zone.
+
+    Only the key (and value) column is read, in chunks of chunk_rows rows whose
+    counts or sums are added to running per-key totals, so memory does not grow
+    with the size of the file.
+
+    Args:
+        csv_path (str or Path): The source CSV.
+        join_key (str): Column holding the zone key. For 'size', a missing key
+            column is derived from the prefix of 'block_hid' when present.
+        agg_method (str): 'size' counts rows per zone, 'sum' sums value_col.
+        value_col (str, optional): The column summed by 'sum'.
+        chunk_rows (int): Rows read per chunk.
+        engine (str): 'c' for the pandas CSV reader or 'pyarrow'.
+
+    Returns:
+        pd.Series: Aggregated values indexed by zone key.
+    """
+    if agg_method not in ('size', 'sum'):
+        raise ValueError(f"Unknown aggregation method '{agg_method}' for {os.path.basename(csv_path)}.")
+    header = pd.read_csv(csv_path, nrows=0).columns
+    key_col = join_key
+    if agg_method == 'size' and 'block_hid' in header and join_key not in header:
+        key_col = 'block_hid'
+    required = [key_col] + ([value_col] if agg_method == 'sum' else [])
+    missing = [col for col in required if col not in header]
+    if missing:
+        raise KeyError(f"{missing} not found in {os.path.basename(csv_path)}")
+
+    accumulator = _KeyAccumulator()
+    string_columns = [key_col] if key_col == 'block_hid' else []
+    for chunk in _iter_csv_chunks(csv_path, required, chunk_rows, engine, string_columns):
+        if key_col == 'block_hid':
+            keys = _block_hid_prefix(chunk['block_hid'].to_numpy())
+        else:
+            keys = chunk[key_col].to_numpy()
+        weights = chunk[value_col].to_numpy() if agg_method == 'sum' else None
+        accumulator.add(keys, weights)
+    return accumulator.to_series(join_key)
+
+
+class SourceCache:
+    """
+    Aggregated source series kept on disk, so a CSV used by several years or run
+    modes is read and aggregated once, and again only after it changes.
+
+    Entries are keyed by the CSV's resolved path, size and modification time
+    together with the join key, aggregation method and value column, and stored
+    as .npz files (zone keys and values). When the cache grows beyond max_mb the
+    least recently used entries are removed. Without a cache_dir, series are only
+    shared within the current process.
+    """
+
+    INDEX_NAME = 'index.json'
+
+    def __init__(self, cache_dir, max_mb=1024):
+        """
+        Args:
+            cache_dir (str or Path, optional): Directory holding the cached series.
+            max_mb (float): Maximum total size of the cached files, in megabytes.
+        """
+        self.cache_dir = str(cache_dir) if cache_dir is not None else None
+        self.max_bytes = int(float(max_mb) * 1024 ** 2)
+        self.index_path = os.path.join(self.cache_dir, self.INDEX_NAME) if self.cache_dir else None
+        self.hits = 0
+        self.misses = 0
+        # Series already used in this process, by cache key.
+        self._memory = {}
+        # Keys put() by a worker whose first get() was already counted by the worker.
+        self._counted = set()
+
+    @staticmethod
+    def source_key(csv_path, join_key, agg_method, value_col=None):
+        """Builds the cache key of an aggregated source from the file's identity on disk."""
+        resolved_path = os.path.realpath(csv_path)
+        stat = os.stat(resolved_path)
+        identity = json.dumps([resolved_path, stat.st_size, stat.st_mtime_ns, join_key, agg_method, value_col])
+        return hashlib.blake2b(identity.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self, index):
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _read(self, key, join_key):
+        """Returns the cached series for key from disk, or None."""
+        if self.cache_dir is None:
+            return None
+        try:
+            with np.load(os.path.join(self.cache_dir, f"{key}.npz"), allow_pickle=False) as data:
+                return pd.Series(data['values'], index=pd.Index(data['keys'], name=join_key))
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _write(self, key, series, csv_path):
+        """Stores a series and evicts the least recently used entries beyond the size limit."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        keys = series.index.to_numpy()
+        if keys.dtype == object:
+            keys = keys.astype(str)
+        file_name = f"{key}.npz"
+        tmp_path = os.path.join(self.cache_dir, f"{key}.{os.getpid()}.tmp.npz")
+        np.savez(tmp_path, keys=keys, values=series.to_numpy())
+        os.replace(tmp_path, os.path.join(self.cache_dir, file_name))
+
+        index = self._load_index()
+        # Entries written by other processes at the same time may be missing from the index.
+        for orphan in os.listdir(self.cache_dir):
+            orphan_key, extension = os.path.splitext(orphan)
+            if extension == '.npz' and '.' not in orphan_key and orphan_key not in index:
+                orphan_path = os.path.join(self.cache_dir, orphan)
+                index[orphan_key] = {
+                    'file': orphan, 'source': None,
+                    'bytes': os.path.getsize(orphan_path), 'last_used': os.path.getmtime(orphan_path),
+                }
+        index[key] = {
+            'file': file_name, 'source': os.path.realpath(csv_path),
+            'bytes': os.path.getsize(os.path.join(self.cache_dir, file_name)), 'last_used': time.time(),
+        }
+        total_bytes = sum(entry['bytes'] for entry in index.values())
+        for old_key in sorted(index, key=lambda k: index[k]['last_used']):
+            if total_bytes <= self.max_bytes or old_key == key:
+                continue
+            total_bytes -= index[old_key]['bytes']
+            try:
+                os.remove(os.path.join(self.cache_dir, index[old_key]['file']))
+            except OSError:
+                pass
+            del index[old_key]
+        self._save_index(index)
+
+    def _touch(self, key):
+        index = self._load_index()
+        if key in index:
+            index[key]['last_used'] = time.time()
+            self._save_index(index)
+
+    def get(self, csv_path, join_key, agg_method, value_col=None, **read_options):
+        """
+        Returns the aggregated series for a source, from memory or disk when the
+        CSV is unchanged, otherwise aggregating the CSV and storing the result.
+        read_options are passed on to aggregate_source.
+        """
+        key = self.source_key(csv_path, join_key, agg_method, value_col)
+        if key in self._memory:
+            if key in self._counted:
+                self._counted.discard(key)
+            else:
+                self.hits += 1
+            return self._memory[key]
+        series = self._read(key, join_key)
+        if series is not None:
+            self.hits += 1
+            self._touch(key)
+        else:
+            self.misses += 1
+            series = aggregate_source(csv_path, join_key, agg_method, value_col, **read_options)
+            if self.cache_dir is not None:
+                try:
+                    self._write(key, series, csv_path)
+                except OSError as e:
+                    print(f"  -> WARNING: Could not write to the source cache {self.cache_dir}: {e}")
+        self._memory[key] = series
+        return series
+
+    def put(self, csv_path, join_key, agg_method, value_col, series, from_cache=False):
+        """
+        Makes a series aggregated elsewhere (e.g. in a worker process) available to
+        get(), counting it as a hit if the worker found it in the cache.
+        """
+        key = self.source_key(csv_path, join_key, agg_method, value_col)
+        self._memory[key] = series
+        self._counted.add(key)
+        if from_cache:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+
+def load_source(label, csv_path, join_key, agg_method, value_col=None, source_cache=None, read_options=None):
+    """Aggregates a source CSV, through the source cache when one is given."""
+    read_options = read_options or {}
+    if source_cache is None:
+        print(f"  -> Reading {label} source: {os.path.basename(csv_path)}")
+        return aggregate_source(csv_path, join_key, agg_method, value_col, **read_options)
+    hits = source_cache.hits
+    series = source_cache.get(csv_path, join_key, agg_method, value_col, **read_options)
+    action = "Using cached" if source_cache.hits > hits else "Read"
+    print(f"  -> {action} {label} source: {os.path.basename(csv_path)}")
+    return series
+
+
+class ZoneIndex:
+    """
+    Row positions of the master zone keys, built once per run mode so each
+    aggregated source can be placed into preallocated column arrays with one
+    vectorized lookup instead of a DataFrame merge.
+    """
+
+    def __init__(self, master_keys):
+        """
+        Args:
+            master_keys (array-like): The join key of every master record (duplicates allowed).
+        """
+        self.zone_keys, self._row_zones = np.unique(np.asarray(master_keys), return_inverse=True)
+        self._row_zones = self._row_zones.ravel()
+
+    def positions(self, keys):
+        """
+        Returns (positions, matched): the zone position of each key and whether
+        the key exists in the master file at all.
+        """
+        keys = np.asarray(keys)
+        positions = np.searchsorted(self.zone_keys, keys)
+        positions = np.minimum(positions, max(len(self.zone_keys) - 1, 0))
+        matched = (self.zone_keys[positions] == keys) if len(self.zone_keys) else np.zeros(len(keys), dtype=bool)
+        return positions, matched
+
+    def add(self, zone_totals, series, label):
+        """
+        Adds a source's aggregated values into per-zone totals and reports the
+        source keys with no master record, whose values are left out.
+        """
+        positions, matched = self.positions(series.index.to_numpy())
+        values = series.to_numpy(dtype=np.float64)
+        np.add.at(zone_totals, positions[matched], values[matched])
+        n_unmatched = int(np.count_nonzero(~matched))
+        if n_unmatched:
+            examples = ', '.join(str(key) for key in series.index[~matched][:5])
+            print(f"  -> WARNING: {n_unmatched:,} keys in {label} have no master record "
+                  f"(total {values[~matched].sum():,.2f} left out), e.g. {examples}.")
+
+    def to_rows(self, zone_totals):
+        """Expands per-zone totals to one value per master record."""
+        return zone_totals[self._row_zones]
+
+
+class Crosswalk:
+    """
+    Apportions source values from blocks to master zones with a sparse
+    zones x blocks weight matrix, for geographies that do not nest in the zones.
+    """
+
+    def __init__(self, csv_path, zone_index, source_key='block_id', zone_key='TAZ_ID',
+                 weight_col=None, normalize_weights=True):
+        """
+        Args:
+            csv_path (str or Path): CSV with one row per block/zone pair.
+            zone_index (ZoneIndex): The master zones of the run mode.
+            source_key (str): Column holding the block key used by the sources.
+            zone_key (str): Column holding the master zone key.
+            weight_col (str, optional): Share of the block assigned to the zone.
+                Without it a block is split equally between its zones.
+            normalize_weights (bool): Scale each block's weights to sum to 1, so
+                the crosswalk preserves totals.
+        """
+        self.zone_index = zone_index
+        columns = [source_key, zone_key] + ([weight_col] if weight_col else [])
+        table = pd.read_csv(csv_path, usecols=columns).dropna()
+        block_keys = table[source_key].to_numpy()
+        weights = table[weight_col].to_numpy(dtype=np.float64) if weight_col else np.ones(len(table))
+        if (weights < 0).any() or not np.isfinite(weights).all():
+            raise ValueError(f"Crosswalk weights in {os.path.basename(csv_path)} must be finite and not negative.")
+
+        self.block_keys, block_positions = np.unique(block_keys, return_inverse=True)
+        block_positions = block_positions.ravel()
+        if normalize_weights:
+            block_weight = np.bincount(block_positions, weights=weights, minlength=len(self.block_keys))
+            weights = np.divide(weights, block_weight[block_positions],
+                                out=np.zeros_like(weights), where=block_weight[block_positions] > 0)
+
+        zone_positions, matched = zone_index.positions(table[zone_key].to_numpy())
+        n_unmatched = int(np.count_nonzero(~matched))
+        if n_unmatched:
+            examples = ', '.join(str(key) for key in pd.unique(table[zone_key].to_numpy()[~matched])[:5])
+            print(f"  -> WARNING: {n_unmatched:,} crosswalk rows point to zones with no master record, "
+                  f"e.g. {examples}. Their share of each block is left out.")
+        self._zones = zone_positions[matched]
+        self._blocks = block_positions[matched]
+        self._weights = weights[matched]
+        self.matrix = None
+        if sparse is not None:
+            self.matrix = sparse.csr_matrix(
+                (self._weights, (self._zones, self._blocks)), shape=(len(zone_index.zone_keys), len(self.block_keys))
+            )
+        print(f"-> Loaded crosswalk of {len(self.block_keys):,} blocks to {len(np.unique(self._zones)):,} zones "
+              f"from {os.path.basename(csv_path)}.")
+
+    def apply(self, labelled_series):
+        """
+        Apportions several aggregated series in one sparse matrix product.
+
+        Args:
+            labelled_series (list): (label, pd.Series indexed by block key) tuples.
+
+        Returns:
+            np.ndarray: Zone totals, one column per series (zones x series).
+        """
+        # Column-major, so each series fills and is read as one contiguous column.
+        block_values = np.zeros((len(self.block_keys), len(labelled_series)), order='F')
+        for column, (label, series) in enumerate(labelled_series):
+            keys = series.index.to_numpy()
+            values = series.to_numpy(dtype=np.float64)
+            positions = np.minimum(np.searchsorted(self.block_keys, keys), max(len(self.block_keys) - 1, 0))
+            matched = (self.block_keys[positions] == keys) if len(self.block_keys) else np.zeros(len(keys), dtype=bool)
+            # Aggregated series have one value per key.
+            block_values[positions[matched], column] = values[matched]
+            n_unmatched = int(np.count_nonzero(~matched))
+            if n_unmatched:
+                examples = ', '.join(str(key) for key in series.index[~matched][:5])
+                print(f"  -> WARNING: {n_unmatched:,} keys in {label} are not in the crosswalk "
+                      f"(total {values[~matched].sum():,.2f} left out), e.g. {examples}.")
+
+        if self.matrix is not None:
+            return np.asarray(self.matrix @ block_values)
+        zone_totals = np.zeros((len(self.zone_index.zone_keys), len(labelled_series)))
+        for column in range(len(labelled_series)):
+            zone_totals[:, column] = np.bincount(
+                self._zones, weights=self._weights * block_values[self._blocks, column],
+                minlength=len(self.zone_index.zone_keys),
+            )
+        return zone_totals
+
+
+def _round_preserving_total(values):
+    """
+    Rounds apportioned counts to integers whose sum equals the rounded total,
+    giving the remaining units to the largest fractional parts.
+    """
+    rounded = np.floor(values)
+    shortfall = int(round(values.sum() - rounded.sum()))
+    if shortfall > 0:
+        rounded[np.argsort(rounded - values, kind='stable')[:shortfall]] += 1
+    return rounded.astype(np.int64)
+
+
+def load_crosswalk(run_config, config, script_dir, zone_index):
+    """Loads the run mode's optional "crosswalk" entry, or returns None."""
+    crosswalk_config = run_config.get('crosswalk')
+    if not crosswalk_config:
+        return None
+    return Crosswalk(
+        resolve_path(crosswalk_config['csv'], config, script_dir), zone_index,
+        source_key=crosswalk_config.get('source_key', 'block_id'),
+        zone_key=crosswalk_config.get('zone_key', run_config['join_key_master']),
+        weight_col=crosswalk_config.get('weight_col'),
+        normalize_weights=crosswalk_config.get('normalize_weights', True),
+    )
+
+
+def source_read_options(config):
+    """Returns the aggregate_source reading options set in the config."""
+    return {
+        'chunk_rows': config.get('source_chunk_rows', DEFAULT_SOURCE_CHUNK_ROWS),
+        'engine': config.get('csv_engine', 'c'),
+    }
+
+
+def list_sources(run_config, config, script_dir):
+    """
+    Lists the distinct aggregated sources a run mode needs, as
+    (csv_path, join_key, agg_method, value_col) tuples in first-use order.
+    """
+    join_key_csv = run_config['join_key_csv']
+    sources = []
+    for dataset in run_config['data_sets']:
+        for source in dataset.get('sources', []):
+            source_join_key = source.get('join_key_source', join_key_csv)
+            for spec in (
+                (str(resolve_path(source['emp_csv'], config, script_dir)), source_join_key, 'sum', source['emp_value_col']),
+                (str(resolve_path(source['pop_csv'], config, script_dir)), source_join_key,
+                 source['pop_agg_method'], source.get('pop_value_col')),
+            ):
+                if spec not in sources:
+                    sources.append(spec)
+    return sources
+
+
+def _aggregate_in_worker(spec, cache_dir, cache_mb, read_options):
+    """Aggregates one source in a worker process, through the on-disk cache when there is one."""
+    csv_path, join_key, agg_method, value_col = spec
+    source_cache = SourceCache(cache_dir, cache_mb)
+    series = source_cache.get(csv_path, join_key, agg_method, value_col, **read_options)
+    return series, source_cache.hits > 0
+
+
+def preload_sources(run_configs, config, script_dir, source_cache, executor):
+    """
+    Aggregates every source used by the given run modes on a process pool, each
+    distinct source once however many years and run modes list it, and makes
+    the results available through source_cache. Failed sources are left for
+    process_run_mode to report.
+    """
+    specs = []
+    for run_config in run_configs:
+        specs += [spec for spec in list_sources(run_config, config, script_dir) if spec not in specs]
+    print(f"\nAggregating {len(specs)} distinct sources on the worker pool...")
+    futures = {
+        executor.submit(_aggregate_in_worker, spec, source_cache.cache_dir,
+                        source_cache.max_bytes / 1024 ** 2, source_read_options(config)): spec
+        for spec in specs
+    }
+    for future in as_completed(futures):
+        spec = futures[future]
+        try:
+            series, from_cache = future.result()
+            source_cache.put(*spec, series, from_cache=from_cache)
+            print(f"  -> Aggregated {os.path.basename(spec[0])} ({spec[2]} by {spec[1]})")
+        except Exception as e:
+            print(f"  -> WARNING: Could not aggregate {os.path.basename(spec[0])}: {e}")
+
+
+class PhaseProfile:
+    """
+    Wall time and peak memory of the pipeline phases ('read', 'aggregate',
+    'merge', 'write'). Times are summed over every entry of a phase (e.g. one
+    per year); memory is the most allocated while a phase ran, measured with
+    tracemalloc when trace_memory is set.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.seconds = {}
+        self.peak_mb = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Context manager timing (and tracing the memory of) one phase entry."""
+        started_tracing = False
+        if self.trace_memory:
+            if tracemalloc.is_tracing():
+                tracemalloc.clear_traces()
+            else:
+                tracemalloc.start()
+                started_tracing = True
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.time() - start_time
+            if self.trace_memory:
+                peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+                self.peak_mb[name] = max(self.peak_mb.get(name, 0.0), peak_mb)
+                if started_tracing:
+                    tracemalloc.stop()
+
+    def summary(self):
+        """Returns a one-line description of the phase times (and peaks)."""
+        parts = []
+        for name, seconds in self.seconds.items():
+            peak = f", {self.peak_mb[name]:,.0f} MB" if name in self.peak_mb else ''
+            parts.append(f"{name} {seconds:.2f}s{peak}")
+        return '; '.join(parts)
+
+
+def _phase(profile, name):
+    """Returns profile.phase(name), or a context that does nothing without a profile."""
+    return profile.phase(name) if profile is not None else contextlib.nullcontext()
+
+
+def process_run_mode(run_config, config, script_dir, source_cache=None, save=True, profile=None):
+    """
+    Main logic to process a run mode defined in the config.
+
+    Args:
+        source_cache (SourceCache, optional): Cache of aggregated sources shared
+            between years and run modes.
+        save (bool): Write the output DBF. When False the caller saves it.
+        profile (PhaseProfile, optional): Records the time spent reading,
+            aggregating, merging and writing.
+
+    Returns:
+        tuple: (DataFrame, output_path) of the assembled run mode, or None if the
+               master file could not be read.
+    """
 
     master_dbf_path = resolve_path(run_config['baseline_dbf_file'], config, script_dir)
+    read_options = source_read_options(config)
     join_key_master = run_config['join_key_master']
     join_key_csv = run_config['join_key_csv']
 
     print(f"Loading base data from master DBF: {master_dbf_path}")
     try:
-        df_merged = pd.DataFrame(iter(DBF(master_dbf_path, lowernames=True)))
+        baseline_columns = run_config.get('baseline_columns')
+        if baseline_columns:
+            baseline_columns = [col.lower() for col in baseline_columns]
+            if join_key_master.lower() not in baseline_columns:
+                baseline_columns.insert(0, join_key_master.lower())
+        with _phase(profile, 'read'):
+            df_merged = read_dbf(master_dbf_path, columns=baseline_columns)
         df_merged[join_key_master.lower()] = df_merged[join_key_master.lower()].astype(int)
         print(f"-> Loaded {len(df_merged)} base records.")
     except Exception as e:
         print(f"FATAL ERROR: Could not read the master DBF file: {e}")
-        return
+        return None
+
+    # Keys are placed by position, so the master frame is only extended once at the end.
+    zone_index = ZoneIndex(df_merged[join_key_master.lower()].to_numpy())
+    try:
+        with _phase(profile, 'read'):
+            crosswalk = load_crosswalk(run_config, config, script_dir, zone_index)
+    except (FileNotFoundError, KeyError, ValueError) as e:
+        print(f"FATAL ERROR: Could not read the crosswalk: {e}")
+        return None
+    new_columns = {}
+    years = []
 
     for dataset in run_config['data_sets']:
         year = dataset['year']
         pop_col = dataset['pop_col_name']
         emp_col = dataset['emp_col_name']
         print(f"\n--- Processing data for year {year} ---")
+        existing = [col for col in (pop_col, emp_col) if col in df_merged.columns or col in new_columns
+                    or any(col in (prior[1], prior[2]) for prior in years)]
+        if existing:
+            print(f"-> WARNING: Columns {existing} already exist. Skipping year {year}.")
+            continue
 
-        all_pop_dfs = []
-        all_emp_dfs = []
+        all_pop_series = []
+        all_emp_series = []
 
         try:
-            for source in dataset.get('sources', []):
-                source_join_key = source.get('join_key_source', join_key_csv)
-
-                # --- Process Employment Data ---
-                emp_csv_path = resolve_path(source['emp_csv'], config, script_dir)
-                print(f"  -> Reading employment source: {os.path.basename(emp_csv_path)}")
-                df_empl_source = pd.read_csv(emp_csv_path)
-                emp_value_col = source['emp_value_col']
-                df_empl_agg = df_empl_source[[source_join_key, emp_value_col]].copy()
-                df_empl_agg.rename(columns={source_join_key: join_key_csv, emp_value_col: 'value'}, inplace=True)
-                all_emp_dfs.append(df_empl_agg)
-
-                # --- Process Population Data ---
-                pop_csv_path = resolve_path(source['pop_csv'], config, script_dir)
-                print(f"  -> Reading population source: {os.path.basename(pop_csv_path)}")
-                df_pop_source = pd.read_csv(pop_csv_path)
-                if source['pop_agg_method'] == 'size':
-                    if 'block_hid' in df_pop_source.columns and source_join_key not in df_pop_source.columns:
-                        df_pop_source[source_join_key] = df_pop_source['block_hid'].astype(str).str.split('_').str[0].astype(int)
-                    df_pop_agg = df_pop_source.groupby(source_join_key).size().reset_index(name='value')
-                elif source['pop_agg_method'] == 'sum':
-                    pop_value_col = source['pop_value_col']
-                    df_pop_agg = df_pop_source.groupby(source_join_key)[pop_value_col].sum().reset_index()
-                    df_pop_agg.rename(columns={pop_value_col: 'value'}, inplace=True)
-                    
-                df_pop_agg.rename(columns={source_join_key: join_key_csv}, inplace=True)
-                all_pop_dfs.append(df_pop_agg)
-
-            if not all_pop_dfs or not all_emp_dfs:
+            with _phase(profile, 'aggregate'):
+                for source in dataset.get('sources', []):
+                    source_join_key = source.get('join_key_source', join_key_csv)
+
+                    # --- Process Employment Data ---
+                    emp_csv_path = resolve_path(source['emp_csv'], config, script_dir)
+                    all_emp_series.append((os.path.basename(emp_csv_path), load_source(
+                        'employment', emp_csv_path, source_join_key, 'sum', source['emp_value_col'], source_cache, read_options
+                    )))
+
+                    # --- Process Population Data ---
+                    pop_csv_path = resolve_path(source['pop_csv'], config, script_dir)
+                    all_pop_series.append((os.path.basename(pop_csv_path), load_source(
+                        'population', pop_csv_path, source_join_key, source['pop_agg_method'], source.get('pop_value_col'), source_cache, read_options
+                    )))
+
+            if not all_pop_series or not all_emp_series:
                 print(f"-> WARNING: No data sources found or processed for year {year}. Skipping.")
                 continue
 
-            # --- Combine all sources for the year by summing ---
-            df_pop_combined = pd.concat(all_pop_dfs)
-            df_pop_total = df_pop_combined.groupby(join_key_csv)['value'].sum().reset_index(name=pop_col)
-
-            df_emp_combined = pd.concat(all_emp_dfs)
-            df_emp_total = df_emp_combined.groupby(join_key_csv)['value'].sum().reset_index(name=emp_col)
-            
-            df_year_data = pd.merge(df_emp_total, df_pop_total, on=join_key_csv, how='outer')
-            print(f"-> Combined {len(dataset.get('sources', []))} sources into {len(df_year_data)} total records for {year}.")
+            if crosswalk is None:
+                with _phase(profile, 'merge'):
+                    # --- Combine all sources for the year by summing into per-zone arrays ---
+                    pop_totals = np.zeros(len(zone_index.zone_keys))
+                    emp_totals = np.zeros(len(zone_index.zone_keys))
+                    for label, series in all_pop_series:
+                        zone_index.add(pop_totals, series, label)
+                    for label, series in all_emp_series:
+                        zone_index.add(emp_totals, series, label)
+                    n_keys = len(np.unique(np.concatenate([series.index.to_numpy() for _, series in all_pop_series + all_emp_series])))
+                    print(f"-> Combined {len(dataset.get('sources', []))} sources into {n_keys} total records for {year}.")
 
-            # --- Merge this year's combined data into the main DataFrame ---
-            df_merged = pd.merge(df_merged, df_year_data, left_on=join_key_master.lower(), right_on=join_key_csv, how='left')
-            df_merged.drop(columns=[join_key_csv], errors='ignore', inplace=True)
-            df_merged[pop_col] = df_merged[pop_col].fillna(0).astype(int)
-            df_merged[emp_col] = df_merged[emp_col].fillna(0).astype(float)
-            print(f"-> Merged {year} data. DataFrame now has {len(df_merged.columns)} columns.")
+                    # --- Place this year's columns next to the master data ---
+                    new_columns[emp_col] = zone_index.to_rows(emp_totals)
+                    new_columns[pop_col] = zone_index.to_rows(pop_totals).astype(np.int64)
+                print(f"-> Assembled {year} data. DataFrame now has {len(df_merged.columns) + len(new_columns)} columns.")
+            else:
+                # Apportioned below, together with every other year.
+                years.append((year, pop_col, emp_col, all_pop_series, all_emp_series))
 
-        except (FileNotFoundError, KeyError) as e:
+        except (FileNotFoundError, KeyError, ValueError) as e:
             print(f"-> WARNING: Could not process dataset for {year}. Skipping. Error: {e}")
             continue
-            
+
+    if years:
+        with _phase(profile, 'merge'):
+            # --- Apportion every series of every year from blocks to zones in one product ---
+            labelled_series = [item for _, _, _, pops, emps in years for item in pops + emps]
+            print(f"\n--- Apportioning {len(labelled_series)} series for {len(years)} years through the crosswalk ---")
+            zone_values = crosswalk.apply(labelled_series)
+            column = 0
+            for year, pop_col, emp_col, all_pop_series, all_emp_series in years:
+                totals = {}
+                for name, series_list in (('population', all_pop_series), ('employment', all_emp_series)):
+                    block_total = sum(series.sum() for _, series in series_list)
+                    totals[name] = zone_values[:, column:column + len(series_list)].sum(axis=1)
+                    column += len(series_list)
+                    print(f"-> {year} {name}: {block_total:,.2f} in sources, {totals[name].sum():,.2f} "
+                          f"apportioned to zones ({block_total - totals[name].sum():,.2f} left out).")
+                new_columns[emp_col] = zone_index.to_rows(totals['employment'])
+                new_columns[pop_col] = zone_index.to_rows(_round_preserving_total(totals['population']))
+            print(f"-> Assembled {len(years)} years. DataFrame now has {len(df_merged.columns) + len(new_columns)} columns.")
+
+    with _phase(profile, 'merge'):
+        df_merged = pd.concat([df_merged, pd.DataFrame(new_columns, index=df_merged.index)], axis=1)
     output_path = resolve_path(run_config['output_file'], config, script_dir)
-    save_dataframe_to_dbf(df_merged, output_path)
+    if save:
+        with _phase(profile, 'write'):
+            save_dataframe_to_dbf(df_merged, output_path)
+    return df_merged, output_path
+
+DEFAULT_SOURCE_CACHE_DIR = "Pipeline Cache/Source Aggregates"
+DEFAULT_SOURCE_CACHE_MB = 1024
+
+
+def select_run_modes(run_mode_args, all_runs):
+    """
+    Resolves --run_mode values ('all', names, or comma-separated names) to run
+    configurations in config order. Returns (selected, unknown names).
+    """
+    names = [name.strip() for arg in run_mode_args for name in arg.split(',') if name.strip()]
+    if 'all' in names:
+        return list(all_runs), []
+    known = {run.get("run_mode") for run in all_runs}
+    selected = [run for run in all_runs if run.get("run_mode") in names]
+    return selected, [name for name in names if name not in known]
+
 
 def main():
     """Parses command line arguments and initiates data processing."""
     parser = argparse.ArgumentParser(description="Process socio-economic data based on a JSON configuration.")
-    parser.add_argument("--run_mode", required=True, help="The specific run mode (e.g., '2025AugRun') to execute from the config file.")
+    parser.add_argument("--run_mode", required=True, nargs="+",
+                        help="Run mode(s) (e.g., '2025AugRun') to execute from the config file, or 'all'.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes used to aggregate sources and write output DBFs.")
+    parser.add_argument("--no_cache", action="store_true",
+                        help="Do not use the on-disk source cache (each CSV is still read once per invocation).")
     args = parser.parse_args()
     
     # Get the absolute path to the directory where this script is located
@@ -152,18 +1085,54 @@ def main():
         print(f"FATAL ERROR: Configuration file '{config_file}' not found.")
         return
         
-    run_mode_arg = args.run_mode
     all_runs = config.get("data_processing_runs", [])
-    target_config = next((run for run in all_runs if run.get("run_mode") == run_mode_arg), None)
-
-    if target_config:
-        print(f"Starting process for run mode: '{run_mode_arg}'")
-        # Pass the script directory to the processing function
-        process_run_mode(target_config, config, script_dir)
-    else:
-        print(f"FATAL ERROR: Run mode '{run_mode_arg}' not found in '{config_file}'.")
+    target_configs, unknown = select_run_modes(args.run_mode, all_runs)
+    if unknown or not target_configs:
+        print(f"FATAL ERROR: Run mode(s) {unknown or args.run_mode} not found in '{config_file}'.")
         return
-    
+
+    cache_dir = None
+    if not args.no_cache:
+        cache_dir = resolve_path(config.get("source_cache_dir", DEFAULT_SOURCE_CACHE_DIR), config, script_dir)
+    source_cache = SourceCache(cache_dir, config.get("source_cache_mb", DEFAULT_SOURCE_CACHE_MB))
+
+    workers = max(1, args.workers)
+    profile = PhaseProfile(trace_memory=False)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        if executor is not None:
+            with profile.phase('aggregate'):
+                preload_sources(target_configs, config, script_dir, source_cache, executor)
+
+        results = []
+        for target_config in target_configs:
+            print(f"\nStarting process for run mode: '{target_config['run_mode']}'")
+            # Pass the script directory to the processing function
+            result = process_run_mode(target_config, config, script_dir, source_cache, save=False, profile=profile)
+            if result is not None:
+                results.append(result)
+
+        output_paths = [str(output_path) for _, output_path in results]
+        for output_path in sorted({path for path in output_paths if output_paths.count(path) > 1}):
+            print(f"WARNING: Several run modes write to {output_path}; the last one listed is kept.")
+        # One write per output file, keeping the last run mode listed for it.
+        writes = list({str(output_path): (df_merged, output_path) for df_merged, output_path in results}.values())
+        with profile.phase('write'):
+            if executor is not None and len(writes) > 1:
+                # Each DBF depends only on its own DataFrame, so files are identical to serial writes.
+                futures = [executor.submit(save_dataframe_to_dbf, df_merged, output_path)
+                           for df_merged, output_path in writes]
+                for future in futures:
+                    future.result()
+            else:
+                for df_merged, output_path in writes:
+                    save_dataframe_to_dbf(df_merged, output_path)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    print(f"\nSource cache: {source_cache.hits} hits, {source_cache.misses} sources read from CSV.")
+    print(f"Phase times: {profile.summary()}")
     print("\nScript finished.")
 
 if __name__ == "__main__":
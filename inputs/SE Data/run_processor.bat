@@ -5,8 +5,8 @@ TITLE TAZ Data Processor (Optimized)
 ::  1. Define required packages
 :: ===================================================================
 @REM set CONDA_PACKAGES=python=3.12
-:: The 'import dbf' module is provided by the 'pysal-dbf' package
-set PIP_PACKAGES=dbfread dbf pandas
+:: DBF output is written natively with numpy; dbfread reads the baseline files
+set PIP_PACKAGES=dbfread pandas numpy
 
 :: ===================================================================
 ::  2. Check for and create the conda environment if needed
@@ -49,7 +49,7 @@ ECHO.
 @REM :: ===================================================================
 @REM ECHO Checking for required packages locally...
 @REM :: Check for one conda package AND one pip package. If both exist, skip.
-@REM (pip list | findstr /I /B "dbfread " > NUL) && (pip list | findstr /I /B "dbf " > NUL)
+@REM (pip list | findstr /I /B "dbfread " > NUL) && (pip list | findstr /I /B "numpy " > NUL)
 
 @REM if %errorlevel% equ 0 (
 @REM     ECHO All key packages found. Skipping installation.
@@ -98,7 +98,7 @@ ECHO.
 :: ===================================================================
 ::  6. Get user input and run the Python script
 :: ===================================================================
-set /p "run_mode_name=Please enter the run mode to execute (e.g., 2025AugRun): "
+set /p "run_mode_name=Please enter the run mode(s) to execute, separated by commas, or 'all' (e.g., 2025AugRun): "
 
 if "%run_mode_name%"=="" (
     ECHO.
@@ -106,13 +106,16 @@ if "%run_mode_name%"=="" (
     GOTO :end
 )
 
+set "worker_count=1"
+set /p "worker_count=Number of worker processes (press Enter for 1): "
+
 ECHO.
 ECHO ========================================================
-ECHO  Running script with run mode: %run_mode_name%
+ECHO  Running script with run mode: %run_mode_name% (%worker_count% workers)
 ECHO ========================================================
 ECHO.
 
-python STOPS_SE_Data_Pipeline.py --run_mode %run_mode_name%
+python STOPS_SE_Data_Pipeline.py --run_mode "%run_mode_name%" --workers %worker_count%
 
 ECHO.
 ECHO ========================================================
@@ -0,0 +1,277 @@
+#### Benchmark harness for skims_file_builder.py
+# Generates synthetic OMX skims and base TAZ pair files, runs SkimFileBuilder on them
+# and appends wall time, peak memory and output throughput to a JSON history file,
+# so runtimes can be compared between code versions without the real TMD23.2 skims.
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import openmatrix as omx
+import tables
+
+from skims_file_builder import SkimFileBuilder, _format_csv_chunk
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not available from the standard library.
+    resource = None
+
+DEFAULT_ZONES = [2000, 5000]
+DEFAULT_HISTORY_FILE = 'skims_benchmark_history.json'
+MATRIX_NAMES = ['dist', 'da_time']
+
+
+def generate_omx(path, n_zones, seed, block_rows=500):
+    """
+    Writes an OMX file with float32 'dist' and 'da_time' matrices of n_zones x n_zones,
+    generated in row blocks so large zone systems do not need the whole matrix in memory.
+    """
+    rng = np.random.default_rng(seed)
+    with omx.open_file(path, 'w') as omx_file:
+        for matrix_name in MATRIX_NAMES:
+            node = omx_file.create_matrix(matrix_name, atom=tables.Float32Atom(), shape=(n_zones, n_zones))
+            for row_start in range(0, n_zones, block_rows):
+                row_end = min(row_start + block_rows, n_zones)
+                node[row_start:row_end] = (rng.random((row_end - row_start, n_zones)) * 120).astype(np.float32)
+
+
+def generate_base_pairs(path, n_zones, pair_fraction, seed, block_rows=500):
+    """
+    Writes a base TAZ pair CSV in the layout of STOPS_PATH_Auto_Skim_Original.csv:
+    origin and destination TAZ followed by eight skim columns, sorted by origin.
+    A pair_fraction below 1 keeps a random subset of the zone pairs.
+
+    Returns:
+        int: Number of pairs written.
+    """
+    rng = np.random.default_rng(seed)
+    n_pairs = 0
+    with open(path, 'wb') as f:
+        for row_start in range(0, n_zones, block_rows):
+            row_end = min(row_start + block_rows, n_zones)
+            orig = np.repeat(np.arange(row_start + 1, row_end + 1, dtype=np.int32), n_zones)
+            dest = np.tile(np.arange(1, n_zones + 1, dtype=np.int32), row_end - row_start)
+            if pair_fraction < 1:
+                keep = rng.random(len(orig)) < pair_fraction
+                orig, dest = orig[keep], dest[keep]
+            zeros = np.zeros(len(orig), dtype=np.float32)
+            f.write(_format_csv_chunk([orig, dest] + [zeros] * 8, decimals=2))
+            n_pairs += len(orig)
+    return n_pairs
+
+
+def prepare_case(work_dir, n_zones, pair_fraction, seed):
+    """
+    Generates the inputs for one zone count, mirroring the shipped configuration:
+    a 2019 skim for columns 2,3 and one 2050 skim listed twice for columns 6,7 and 8,9.
+
+    Returns:
+        dict: Paths of the generated files and the number of TAZ pairs.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    omx_2019 = os.path.join(work_dir, 'hwy_am_2019.omx')
+    omx_2050 = os.path.join(work_dir, 'hwy_am_2050.omx')
+    base_path = os.path.join(work_dir, 'STOPS_PATH_Auto_Skim_Original.csv')
+    print(f"Generating synthetic inputs for {n_zones:,} zones in {work_dir}...")
+    generate_omx(omx_2019, n_zones, seed)
+    generate_omx(omx_2050, n_zones, seed + 1)
+    n_pairs = generate_base_pairs(base_path, n_zones, pair_fraction, seed)
+    return {'omx_2019': omx_2019, 'omx_2050': omx_2050, 'base_path': base_path, 'n_pairs': n_pairs}
+
+
+def write_config(work_dir, case, settings):
+    """Writes a builder configuration for the case and returns its path."""
+    config = {
+        'base_taz_pair_file': case['base_path'],
+        'output_csv_path': os.path.join(work_dir, 'STOPS_PATH_Auto_Skim.csv'),
+        'data_display_row_count': 0,
+        'omx_configs': [
+            {'omx_file_path': case['omx_2019'], 'matrix_to_column_index': {'dist': 2, 'da_time': 3}},
+            {'omx_file_path': case['omx_2050'], 'matrix_to_column_index': {'dist': 6, 'da_time': 7}},
+            {'omx_file_path': case['omx_2050'], 'matrix_to_column_index': {'dist': 8, 'da_time': 9}},
+        ],
+        **settings,
+    }
+    config_path = os.path.join(work_dir, 'benchmark_configuration.json')
+    with open(config_path, 'w') as f:
+        json.dump(config, f, indent=4)
+    return config_path
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process and its finished children, in MB, or None."""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    scale = 1024 ** 2 if platform.system() == 'Darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / scale, 1)
+
+
+def _run_builder(config_path, result_queue):
+    """Runs one build in a fresh process, so peak memory belongs to this run alone."""
+    start_time = time.time()
+    builder = SkimFileBuilder(config_path)
+    builder.process_skims()
+    builder.save_output()
+    result_queue.put({
+        'wall_seconds': round(time.time() - start_time, 3),
+        'phase_seconds': {phase: round(seconds, 3) for phase, seconds in builder.phase_times.items()},
+        'output_bytes': builder.last_output_bytes,
+        'peak_rss_mb': _peak_rss_mb(),
+    })
+
+
+def run_case(config_path, n_pairs):
+    """
+    Runs the builder on a prepared configuration in a spawned process and
+    returns its timings, peak memory and output throughput.
+    """
+    context = multiprocessing.get_context('spawn')
+    result_queue = context.Queue()
+    process = context.Process(target=_run_builder, args=(config_path, result_queue))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"Benchmark run for {config_path} failed with exit code {process.exitcode}.")
+    result = result_queue.get()
+    save_seconds = result['phase_seconds'].get('save') or 0.0
+    result['rows_per_second'] = round(n_pairs / result['wall_seconds']) if result['wall_seconds'] else None
+    result['save_mb_per_second'] = (
+        round(result['output_bytes'] / 1024 ** 2 / save_seconds, 1) if save_seconds else None
+    )
+    return result
+
+
+def _git_revision():
+    """Returns the current git commit of the repository, or None outside a checkout."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def append_history(history_path, record):
+    """Appends a benchmark record to the JSON history file (a list of records)."""
+    history = []
+    if os.path.exists(history_path):
+        with open(history_path, 'r') as f:
+            history = json.load(f)
+    history.append(record)
+    tmp_path = f"{history_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp_path, history_path)
+
+
+def run_benchmarks(zone_counts, settings_list, history_path, pair_fraction=1.0, seed=0, work_root=None, keep=False):
+    """
+    Benchmarks every zone count against every builder settings variant.
+
+    Each variant is run twice on the same inputs: a cold build from the base
+    pair file, then a warm re-run that finds the output and sidecar store in place.
+
+    Args:
+        zone_counts (list): Zone counts to generate inputs for.
+        settings_list (list): Dicts of builder configuration overrides to compare.
+        history_path (str): JSON file the results are appended to.
+        pair_fraction (float): Share of all zone pairs present in the base file.
+        seed (int): Seed for the synthetic data.
+        work_root (str, optional): Directory for generated inputs (a temp dir by default).
+        keep (bool): Keep the generated inputs instead of deleting them.
+
+    Returns:
+        dict: The record appended to the history file.
+    """
+    work_root = work_root or tempfile.mkdtemp(prefix='skims_benchmark_')
+    record = {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_revision': _git_revision(),
+        'host': platform.node(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pair_fraction': pair_fraction,
+        'results': [],
+    }
+    try:
+        for n_zones in zone_counts:
+            case_dir = os.path.join(work_root, f"zones_{n_zones}")
+            case = prepare_case(case_dir, n_zones, pair_fraction, seed)
+            for settings in settings_list:
+                # Start each variant cold: no output, sidecar store or cached pair index.
+                output_path = os.path.join(case_dir, 'STOPS_PATH_Auto_Skim.csv')
+                for stale in (output_path, f"{output_path}.store", f"{case['base_path']}.odindex"):
+                    if os.path.isdir(stale):
+                        shutil.rmtree(stale)
+                    elif os.path.exists(stale):
+                        os.remove(stale)
+                config_path = write_config(case_dir, case, settings)
+                for run in ('cold', 'warm'):
+                    print(f"\n=== {n_zones:,} zones, {case['n_pairs']:,} pairs, {settings}, {run} run ===")
+                    result = run_case(config_path, case['n_pairs'])
+                    result.update({'zones': n_zones, 'pairs': case['n_pairs'], 'settings': settings, 'run': run})
+                    record['results'].append(result)
+    finally:
+        if not keep:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    append_history(history_path, record)
+    print_summary(record)
+    print(f"\nResults appended to {history_path}")
+    return record
+
+
+def print_summary(record):
+    """Prints one line per benchmark result."""
+    print("\n--- Benchmark Summary ---")
+    for result in record['results']:
+        phases = ', '.join(f"{phase} {seconds:.2f}s" for phase, seconds in result['phase_seconds'].items())
+        peak = f"{result['peak_rss_mb']:,.0f} MB" if result['peak_rss_mb'] is not None else 'n/a'
+        print(f"{result['zones']:>7,} zones {result['run']:>4} {json.dumps(result['settings'])}: "
+              f"{result['wall_seconds']:.2f}s ({phases}); peak RSS {peak}; "
+              f"{result['rows_per_second'] or 0:,} rows/s")
+
+
+def main():
+    """Parses command line arguments and runs the benchmarks."""
+    parser = argparse.ArgumentParser(description="Benchmark SkimFileBuilder on synthetic OMX skims.")
+    parser.add_argument("--zones", type=int, nargs='+', default=DEFAULT_ZONES,
+                        help="Zone counts to benchmark (e.g. 2000 5000 10000).")
+    parser.add_argument("--modes", nargs='+', default=['full'], choices=['full', 'streaming'],
+                        help="Extraction modes to compare.")
+    parser.add_argument("--workers", type=int, nargs='+', default=[1],
+                        help="Worker counts to compare.")
+    parser.add_argument("--memory-budget-mb", type=float, default=256,
+                        help="memory_budget_mb used in streaming mode.")
+    parser.add_argument("--pair-fraction", type=float, default=1.0,
+                        help="Share of all zone pairs present in the base pair file.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic data.")
+    parser.add_argument("--history", default=DEFAULT_HISTORY_FILE, help="JSON history file to append to.")
+    parser.add_argument("--work-dir", default=None, help="Directory for generated inputs.")
+    parser.add_argument("--keep", action='store_true', help="Keep the generated inputs.")
+    args = parser.parse_args()
+
+    settings_list = [
+        {'extraction_mode': mode, 'max_workers': workers, 'memory_budget_mb': args.memory_budget_mb}
+        for mode in args.modes for workers in args.workers
+    ]
+    run_benchmarks(args.zones, settings_list, args.history, args.pair_fraction, args.seed, args.work_dir, args.keep)
+
+
+if __name__ == '__main__':
+    main()
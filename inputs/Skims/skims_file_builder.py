@@ -5,26 +5,754 @@ import numpy as np
 import openmatrix as omx
 import json
 import os
+import sys
 import time
+import tracemalloc
+import argparse
+import ast
+import hashlib
+import heapq
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+
+class MatrixCache:
+    """
+    A least-recently-used cache of OMX matrix data, capped by total memory. It
+    holds SkimLookup's row blocks; the builder keeps no matrices between reads
+    (reuse across configurations comes from SkimFileBuilder._plan_matrix_reads).
+
+    source_key identifies a matrix by (resolved path, matrix name, file mtime,
+    file size), so a file that changes on disk is never taken for the old one.
+    """
+
+    def __init__(self, max_mb):
+        """
+        Args:
+            max_mb (float): Maximum memory, in megabytes, held by cached matrices.
+        """
+        self.max_bytes = int(float(max_mb) * 1024 ** 2)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def source_key(omx_path, matrix_name):
+        """Builds the cache key for a matrix from the OMX file's identity on disk."""
+        resolved_path = os.path.realpath(omx_path)
+        stat = os.stat(resolved_path)
+        return (resolved_path, matrix_name, stat.st_mtime_ns, stat.st_size)
+
+    def get(self, key):
+        """Returns the cached matrix for key, or None, and records a hit or miss."""
+        matrix_data = self._entries.get(key)
+        if matrix_data is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return matrix_data
+
+    def put(self, key, matrix_data):
+        """Stores a matrix, evicting the least recently used entries to stay under the cap."""
+        if matrix_data.nbytes > self.max_bytes or key in self._entries:
+            return
+        while self._entries and self.current_bytes + matrix_data.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= evicted.nbytes
+        self._entries[key] = matrix_data
+        self.current_bytes += matrix_data.nbytes
+
+    def clear(self):
+        """Drops every cached matrix."""
+        self._entries.clear()
+        self.current_bytes = 0
+
+
+class _LazyOmxFile:
+    """Opens an OMX file on first access and closes it on exit."""
+
+    def __init__(self, omx_path):
+        self.omx_path = omx_path
+        self._file = None
+
+    @property
+    def file(self):
+        if self._file is None:
+            self._file = omx.open_file(self.omx_path, 'r')
+        return self._file
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _flat_pair_index(orig_taz, dest_taz, n_zones):
+    """
+    Converts 1-based origin/destination TAZ columns into a flat linear index
+    (orig * n_zones + dest, 0-based) into an n_zones x n_zones matrix, so each
+    matrix lookup becomes a single take() on the flattened matrix.
+
+    Raises:
+        ValueError: If any TAZ lies outside 1..n_zones, listing the first few
+                    offending pairs, before any matrix is read.
+    """
+    orig_taz = np.asarray(orig_taz)
+    dest_taz = np.asarray(dest_taz)
+    out_of_range = (orig_taz < 1) | (orig_taz > n_zones) | (dest_taz < 1) | (dest_taz > n_zones)
+    n_out_of_range = int(np.count_nonzero(out_of_range))
+    if n_out_of_range:
+        examples = ', '.join(
+            f"row {row + 1}: {orig_taz[row]}-{dest_taz[row]}" for row in np.flatnonzero(out_of_range)[:5]
+        )
+        raise ValueError(
+            f"{n_out_of_range:,} TAZ pairs reference zones outside 1..{n_zones} of the OMX matrices ({examples})."
+        )
+    return (orig_taz.astype(np.int64) - 1) * n_zones + (dest_taz.astype(np.int64) - 1)
+
+
+def _take_pairs(matrix_data, pair_index):
+    """Looks up every TAZ pair in a full matrix with one take() on its flattened view."""
+    return np.ascontiguousarray(matrix_data).reshape(-1).take(pair_index)
+
+
+def _build_origin_plan(pair_index, n_zones):
+    """
+    Sorts the TAZ pairs by origin once so that streaming extraction can
+    find the pairs belonging to each block of matrix rows with a binary search.
+
+    Args:
+        pair_index (np.ndarray): Flat linear index of every TAZ pair.
+        n_zones (int): Number of zones in the OMX matrices.
+
+    Returns:
+        tuple: (order, sorted_orig, sorted_dest) where order is the stable argsort
+               of the pairs and sorted_orig/sorted_dest hold their 0-based origin
+               and destination in that order.
+    """
+    order = np.argsort(pair_index, kind='stable')
+    sorted_orig, sorted_dest = np.divmod(pair_index[order], n_zones)
+    return order, sorted_orig.astype(np.int32), sorted_dest.astype(np.int32)
+
+
+def _streaming_block_rows(matrix_node, memory_budget_mb):
+    """
+    Determines how many matrix rows fit in the memory budget, rounded down
+    to whole HDF5 chunks where possible.
+    """
+    n_cols = matrix_node.shape[1]
+    budget_bytes = float(memory_budget_mb) * 1024 ** 2
+    block_rows = max(1, int(budget_bytes // (n_cols * matrix_node.dtype.itemsize)))
+    chunkshape = getattr(matrix_node, 'chunkshape', None)
+    if chunkshape and block_rows > chunkshape[0]:
+        block_rows -= block_rows % chunkshape[0]
+    return block_rows
+
+
+def _stream_gather(matrix_node, origin_plan, memory_budget_mb):
+    """
+    Gathers the value for every TAZ pair by reading the matrix in row blocks
+    and scattering each block's values into the output. Gives the same result
+    as reading the whole matrix while holding at most one block in memory.
+
+    Args:
+        matrix_node: The OMX (HDF5) matrix node.
+        origin_plan (tuple): Output of _build_origin_plan.
+        memory_budget_mb (float): Maximum size of one block of rows.
+
+    Returns:
+        np.ndarray: The gathered values in the matrix's own dtype.
+    """
+    order, sorted_orig, sorted_dest = origin_plan
+    n_rows = matrix_node.shape[0]
+    if len(sorted_orig) and (sorted_orig[0] < 0 or sorted_orig[-1] >= n_rows):
+        raise IndexError(f"Origin TAZ outside the matrix's {n_rows} rows.")
+
+    values = np.empty(len(order), dtype=matrix_node.dtype)
+    block_rows = _streaming_block_rows(matrix_node, memory_budget_mb)
+    for row_start in range(0, n_rows, block_rows):
+        row_end = min(row_start + block_rows, n_rows)
+        lo, hi = np.searchsorted(sorted_orig, [row_start, row_end])
+        if lo == hi:
+            # No TAZ pair originates in this block, so it is never read.
+            continue
+        block = matrix_node[row_start:row_end]
+        values[order[lo:hi]] = block[sorted_orig[lo:hi] - row_start, sorted_dest[lo:hi]]
+    return values
+
+
+class SkimExpression:
+    """
+    A derived skim column computed from OMX matrices, such as
+    "0.5*(am.da_time+pm.da_time)" where am and pm are aliases of OMX files.
+
+    The expression is parsed with the ast module and only numbers, matrix
+    references (alias.matrix, or alias['matrix name']), arithmetic,
+    comparisons and the functions in FUNCTIONS are accepted, so a
+    configuration file cannot run arbitrary code.
+    """
+
+    FUNCTIONS = {
+        'min': np.minimum, 'max': np.maximum, 'clip': np.clip, 'where': np.where,
+        'abs': np.abs, 'sqrt': np.sqrt, 'exp': np.exp, 'log': np.log, 'round': np.round,
+    }
+    BINARY_OPERATORS = {
+        ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.true_divide,
+        ast.FloorDiv: np.floor_divide, ast.Mod: np.mod, ast.Pow: np.power,
+    }
+    UNARY_OPERATORS = {ast.USub: np.negative, ast.UAdd: np.positive}
+    COMPARISONS = {
+        ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal,
+        ast.Eq: np.equal, ast.NotEq: np.not_equal,
+    }
+
+    def __init__(self, text, aliases):
+        """
+        Args:
+            text (str): The expression.
+            aliases (iterable): Names that may be used for OMX files in the expression.
+
+        Raises:
+            ValueError: If the expression is not valid, uses anything not allowed,
+                        an unknown alias, or references no matrix.
+        """
+        self.text = text
+        self.aliases = set(aliases)
+        # (alias, matrix name) pairs in order of first use.
+        self.operands = []
+        try:
+            tree = ast.parse(text.strip(), mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f"Invalid expression '{text}': {e.msg}.")
+        self._evaluate = self._compile(tree.body)
+        if not self.operands:
+            raise ValueError(f"Expression '{text}' does not reference any matrix.")
+
+    def _operand(self, alias_node, matrix_name):
+        """Registers an alias.matrix reference and returns a function looking it up."""
+        if not isinstance(alias_node, ast.Name) or alias_node.id not in self.aliases:
+            name = getattr(alias_node, 'id', ast.dump(alias_node))
+            raise ValueError(f"Unknown OMX alias '{name}' in expression '{self.text}'; "
+                             f"defined aliases are {sorted(self.aliases)}.")
+        operand = (alias_node.id, matrix_name)
+        if operand not in self.operands:
+            self.operands.append(operand)
+        return lambda values: values[operand]
+
+    def _compile(self, node):
+        """Turns an AST node into a function of {(alias, matrix name): values}."""
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            constant = node.value
+            return lambda values: constant
+        if isinstance(node, ast.Attribute):
+            return self._operand(node.value, node.attr)
+        if isinstance(node, ast.Subscript):
+            # Python 3.8 wraps the key in ast.Index; later versions do not.
+            index_type = getattr(ast, 'Index', ())
+            key = node.slice.value if isinstance(node.slice, index_type) else node.slice
+            if isinstance(key, ast.Constant) and isinstance(key.value, str):
+                return self._operand(node.value, key.value)
+        if isinstance(node, ast.BinOp) and type(node.op) in self.BINARY_OPERATORS:
+            operator = self.BINARY_OPERATORS[type(node.op)]
+            left, right = self._compile(node.left), self._compile(node.right)
+            return lambda values: operator(left(values), right(values))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in self.UNARY_OPERATORS:
+            operator = self.UNARY_OPERATORS[type(node.op)]
+            operand = self._compile(node.operand)
+            return lambda values: operator(operand(values))
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in self.COMPARISONS:
+            operator = self.COMPARISONS[type(node.ops[0])]
+            left, right = self._compile(node.left), self._compile(node.comparators[0])
+            return lambda values: operator(left(values), right(values))
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                and node.func.id in self.FUNCTIONS and not node.keywords):
+            function = self.FUNCTIONS[node.func.id]
+            arguments = [self._compile(argument) for argument in node.args]
+            return lambda values: function(*[argument(values) for argument in arguments])
+        raise ValueError(f"Unsupported element '{ast.dump(node)}' in expression '{self.text}'.")
+
+    def evaluate(self, values):
+        """
+        Evaluates the expression.
+
+        Args:
+            values (dict): (alias, matrix name) -> NumPy array of matrix values.
+
+        Returns:
+            np.ndarray: The result as float64; non-finite results (e.g. division by zero) become NaN.
+        """
+        length = len(next(iter(values.values())))
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            result = np.asarray(self._evaluate(values), dtype=np.float64)
+        result = np.array(np.broadcast_to(result, (length,)))
+        result[~np.isfinite(result)] = np.nan
+        return result
+
+
+def _stream_evaluate(matrix_nodes, expression, origin_plan, memory_budget_mb):
+    """
+    Evaluates a SkimExpression for every TAZ pair in a single pass over its matrices.
+
+    All operand matrices are read together in row blocks; from each block only
+    the values of the TAZ pairs originating in it are gathered and combined, so
+    neither whole matrices nor full-length intermediate columns are held in memory.
+
+    Args:
+        matrix_nodes (dict): (alias, matrix name) -> OMX (HDF5) matrix node, one per operand.
+        expression (SkimExpression): The expression to evaluate.
+        origin_plan (tuple): Output of _build_origin_plan.
+        memory_budget_mb (float): Maximum size of one block of rows of all operands together.
+
+    Returns:
+        np.ndarray: The expression's value for every TAZ pair, as float32.
+    """
+    order, sorted_orig, sorted_dest = origin_plan
+    n_rows = min(node.shape[0] for node in matrix_nodes.values())
+    if len(sorted_orig) and (sorted_orig[0] < 0 or sorted_orig[-1] >= n_rows):
+        raise IndexError(f"Origin TAZ outside the matrix's {n_rows} rows.")
+
+    values = np.empty(len(order), dtype=np.float32)
+    block_rows = min(
+        _streaming_block_rows(node, float(memory_budget_mb) / len(matrix_nodes)) for node in matrix_nodes.values()
+    )
+    for row_start in range(0, n_rows, block_rows):
+        row_end = min(row_start + block_rows, n_rows)
+        lo, hi = np.searchsorted(sorted_orig, [row_start, row_end])
+        if lo == hi:
+            continue
+        rows, cols = sorted_orig[lo:hi] - row_start, sorted_dest[lo:hi]
+        operand_values = {operand: node[row_start:row_end][rows, cols] for operand, node in matrix_nodes.items()}
+        values[order[lo:hi]] = expression.evaluate(operand_values)
+    return values
+
+
+def _round_skim_values(values):
+    """Converts gathered matrix values to the float32, 2-decimal skim column format."""
+    return np.round(values.astype(np.float32), 2)
+
+
+# State shared with worker processes by _init_gather_worker, so the TAZ pair
+# arrays are sent once per worker rather than once per matrix.
+_WORKER_STATE = {}
+
+
+def _init_gather_worker(pair_index, origin_plan, memory_budget_mb):
+    """
+    Initializer for worker processes; stores the TAZ pair index for _gather_in_worker.
+    pair_index may be the path of a cached .npy index, which is then memory-mapped
+    instead of being copied to every worker.
+    """
+    if isinstance(pair_index, str):
+        pair_index = np.load(pair_index, mmap_mode='r')
+    _WORKER_STATE.update(pair_index=pair_index, origin_plan=origin_plan, memory_budget_mb=memory_budget_mb)
+
+
+def _gather_in_worker(omx_path, matrix_name):
+    """Reads one matrix in a worker process and returns its rounded skim column."""
+    with omx.open_file(omx_path, 'r') as omx_file:
+        matrix_node = omx_file[matrix_name]
+        if _WORKER_STATE['origin_plan'] is None:
+            values = _take_pairs(matrix_node.read(), _WORKER_STATE['pair_index'])
+        else:
+            values = _stream_gather(matrix_node, _WORKER_STATE['origin_plan'], _WORKER_STATE['memory_budget_mb'])
+    return _round_skim_values(values)
+
+
+_ASCII_ZERO = ord('0')
+
+
+def _digit_field(magnitudes):
+    """
+    Renders non-negative integers as right-aligned ASCII digits.
+
+    Returns:
+        tuple: (chars, lengths) where chars is a (rows, width) uint8 array whose
+               last lengths[i] bytes of row i hold the digits of magnitudes[i].
+    """
+    max_value = int(magnitudes.max()) if len(magnitudes) else 0
+    width = len(str(max_value))
+    chars = np.empty((len(magnitudes), width), dtype=np.uint8)
+    remaining = magnitudes.copy()
+    for position in range(width - 1, -1, -1):
+        chars[:, position] = remaining % 10 + _ASCII_ZERO
+        remaining //= 10
+    lengths = np.ones(len(magnitudes), dtype=np.int64)
+    for power in range(1, width):
+        lengths += magnitudes >= 10 ** power
+    return chars, lengths
+
+
+def _format_int_field(values):
+    """Formats an integer column like '%d', as right-aligned (chars, lengths)."""
+    values = values.astype(np.int64)
+    negative = values < 0
+    digits, lengths = _digit_field(np.abs(values))
+    chars = np.concatenate([np.full((len(values), 1), ord(' '), dtype=np.uint8), digits], axis=1)
+    rows = np.flatnonzero(negative)
+    chars[rows, chars.shape[1] - 1 - lengths[rows]] = ord('-')
+    return chars, lengths + negative
+
+
+def _format_float_field(values, decimals):
+    """
+    Formats a float column like '%.<decimals>f', as right-aligned (chars, lengths).
+    NaN (and other non-finite) values become empty fields, as in DataFrame.to_csv.
+    """
+    values = values.astype(np.float64)
+    finite = np.isfinite(values)
+    scale = 10 ** decimals
+    magnitudes = np.where(finite, np.abs(values), 0.0) * scale
+    if len(magnitudes) and magnitudes.max() >= 2 ** 62:
+        raise ValueError(f"Values too large to format with {decimals} decimals.")
+    scaled = np.rint(magnitudes).astype(np.int64)
+    int_chars, int_lengths = _digit_field(scaled // scale)
+    frac_chars, _ = _digit_field(scaled % scale + scale)
+    parts = [np.full((len(values), 1), ord(' '), dtype=np.uint8), int_chars]
+    if decimals:
+        parts += [np.full((len(values), 1), ord('.'), dtype=np.uint8), frac_chars[:, 1:]]
+    chars = np.concatenate(parts, axis=1)
+    lengths = int_lengths + (decimals + 1 if decimals else 0)
+    # np.signbit matches printf, which writes '-0.00' for negative values that round to zero.
+    negative = np.signbit(values) & finite
+    rows = np.flatnonzero(negative)
+    chars[rows, chars.shape[1] - 1 - lengths[rows]] = ord('-')
+    lengths = np.where(finite, lengths + negative, 0)
+    return chars, lengths
+
+
+def _format_csv_chunk(columns, decimals):
+    """
+    Formats a block of rows as CSV bytes without a per-row Python loop.
+
+    Every field is rendered right-aligned into a fixed-width byte matrix with a
+    mask of the bytes actually used. Concatenating the fields, separators and
+    newlines side by side and selecting the masked bytes in row-major order
+    yields the CSV text.
+
+    Args:
+        columns (list): 1-D NumPy arrays of equal length, one per CSV column.
+        decimals (int): Decimal places written for float columns.
+
+    Returns:
+        bytes: The CSV text for the rows, newline-terminated.
+    """
+    n_rows = len(columns[0]) if columns else 0
+    if n_rows == 0:
+        return b''
+    chars_parts, mask_parts = [], []
+    for index, values in enumerate(columns):
+        if index:
+            chars_parts.append(np.full((n_rows, 1), ord(','), dtype=np.uint8))
+            mask_parts.append(np.ones((n_rows, 1), dtype=bool))
+        if np.issubdtype(values.dtype, np.integer):
+            chars, lengths = _format_int_field(values)
+        else:
+            chars, lengths = _format_float_field(values, decimals)
+        width = chars.shape[1]
+        chars_parts.append(chars)
+        mask_parts.append(np.arange(width) >= (width - lengths)[:, None])
+    chars_parts.append(np.full((n_rows, 1), ord('\n'), dtype=np.uint8))
+    mask_parts.append(np.ones((n_rows, 1), dtype=bool))
+    return np.concatenate(chars_parts, axis=1)[np.concatenate(mask_parts, axis=1)].tobytes()
+
+
+def write_skim_csv(df, output_path, decimals=2, chunk_rows=500_000, workers=1, buffer_mb=16):
+    """
+    Writes the skim table as a headerless CSV much faster than DataFrame.to_csv.
+
+    Integer columns (the TAZ pair) are written like '%d' and float columns like
+    '%.2f'; NaN values are written as empty fields. Rows are formatted in chunks,
+    optionally on several threads, and written in order through a large buffer
+    to a temporary file that replaces output_path only once it is complete.
+
+    Args:
+        df (pd.DataFrame): The skim table, in output column order.
+        output_path (str): Destination CSV path.
+        decimals (int): Decimal places written for float columns.
+        chunk_rows (int): Rows formatted per chunk.
+        workers (int): Number of threads formatting chunks.
+        buffer_mb (int): Size of the file write buffer in megabytes.
+
+    Returns:
+        int: Number of bytes written.
+    """
+    columns = [df[col].to_numpy() for col in df.columns]
+    n_rows = len(df)
+    chunk_starts = range(0, n_rows, chunk_rows)
+
+    def format_chunk(start):
+        return _format_csv_chunk([values[start:start + chunk_rows] for values in columns], decimals)
+
+    tmp_path = f"{output_path}.tmp"
+    bytes_written = 0
+    try:
+        with open(tmp_path, 'wb', buffering=int(buffer_mb * 1024 ** 2)) as f:
+            if workers > 1:
+                # Keep a bounded window of chunks in flight so memory stays flat.
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    pending = deque()
+                    for start in chunk_starts:
+                        pending.append(executor.submit(format_chunk, start))
+                        if len(pending) >= 2 * workers:
+                            bytes_written += f.write(pending.popleft().result())
+                    while pending:
+                        bytes_written += f.write(pending.popleft().result())
+            else:
+                for start in chunk_starts:
+                    bytes_written += f.write(format_chunk(start))
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return bytes_written
+
+
+def _file_fingerprint(path, previous=None):
+    """
+    Identifies a file's content by size, modification time and a BLAKE2 hash.
+
+    Hashing a multi-GB OMX file is slow, so when the size and mtime match a
+    previous fingerprint its hash is reused instead of reading the file again.
+
+    Args:
+        path (str): The file to fingerprint.
+        previous (dict, optional): An earlier fingerprint of the same file.
+
+    Returns:
+        dict: {'path', 'size', 'mtime_ns', 'hash'}.
+    """
+    resolved_path = os.path.realpath(path)
+    stat = os.stat(resolved_path)
+    if (previous and previous.get('path') == resolved_path and previous.get('size') == stat.st_size
+            and previous.get('mtime_ns') == stat.st_mtime_ns):
+        return dict(previous)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(resolved_path, 'rb') as f:
+        for block in iter(lambda: f.read(8 * 1024 ** 2), b''):
+            digest.update(block)
+    return {'path': resolved_path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': digest.hexdigest()}
+
+
+class SkimSidecarStore:
+    """
+    A binary copy of the skim table kept next to the output CSV: one memory-mapped
+    .npy file per column plus a JSON manifest recording, for every skim column,
+    the OMX file (with its content hash) and matrix it was built from.
+
+    Loading the table from the store takes milliseconds instead of re-parsing the
+    CSV, and the manifest lets the builder recompute only the columns whose OMX
+    source has changed.
+    """
+
+    MANIFEST_NAME = 'manifest.json'
+    VERSION = 1
+
+    def __init__(self, store_dir):
+        """
+        Args:
+            store_dir (str): Directory holding the column files and manifest.
+        """
+        self.store_dir = store_dir
+        self.manifest_path = os.path.join(store_dir, self.MANIFEST_NAME)
+
+    def load_manifest(self):
+        """Returns the manifest if the store is complete and readable, otherwise None."""
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if manifest.get('version') != self.VERSION:
+            return None
+        for column in manifest.get('columns', {}).values():
+            if not os.path.exists(os.path.join(self.store_dir, column['file'])):
+                return None
+        return manifest
+
+    @staticmethod
+    def matches_csv(manifest, csv_path):
+        """True if csv_path is the CSV that was written together with this manifest."""
+        csv_state = manifest.get('csv')
+        if not csv_state or not os.path.exists(csv_path):
+            return False
+        stat = os.stat(csv_path)
+        return csv_state['size'] == stat.st_size and csv_state['mtime_ns'] == stat.st_mtime_ns
+
+    def load_dataframe(self, manifest):
+        """Builds the skim DataFrame from memory-mapped column files, without copying them."""
+        columns = {
+            int(col): np.load(os.path.join(self.store_dir, entry['file']), mmap_mode='r')
+            for col, entry in sorted(manifest['columns'].items(), key=lambda item: int(item[0]))
+        }
+        return pd.DataFrame(columns, copy=False)
+
+    def save(self, df, manifest, changed_columns, column_sources, csv_path):
+        """
+        Writes the changed columns and a new manifest.
+
+        Column files are written under new names rather than overwritten, so
+        files still memory-mapped by the current DataFrame are never replaced
+        in place; superseded files are removed afterwards where possible.
+
+        Args:
+            df (pd.DataFrame): The skim table.
+            manifest (dict): The manifest the table was loaded with, or None.
+            changed_columns (set): Columns whose values differ from the store.
+            column_sources (dict): Column index -> OMX source fingerprint.
+            csv_path (str): The CSV written from the same table.
+        """
+        os.makedirs(self.store_dir, exist_ok=True)
+        old_columns = (manifest or {}).get('columns', {})
+        stamp = time.time_ns()
+        new_columns = {}
+        for col in df.columns:
+            key = str(col)
+            if col not in changed_columns and key in old_columns:
+                new_columns[key] = {k: v for k, v in old_columns[key].items() if k != 'source'}
+            else:
+                file_name = f"col_{col}_{stamp}.npy"
+                np.save(os.path.join(self.store_dir, file_name), df[col].to_numpy())
+                new_columns[key] = {'file': file_name, 'dtype': str(df[col].dtype)}
+            if col in column_sources:
+                new_columns[key]['source'] = column_sources[col]
+
+        csv_stat = os.stat(csv_path)
+        new_manifest = {
+            'version': self.VERSION,
+            'n_rows': len(df),
+            'csv': {'path': os.path.realpath(csv_path), 'size': csv_stat.st_size, 'mtime_ns': csv_stat.st_mtime_ns},
+            'columns': new_columns,
+        }
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(new_manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+        live_files = {entry['file'] for entry in new_columns.values()} | {self.MANIFEST_NAME}
+        for file_name in os.listdir(self.store_dir):
+            if file_name not in live_files:
+                try:
+                    os.remove(os.path.join(self.store_dir, file_name))
+                except OSError:
+                    # Still memory-mapped (Windows); it is removed on the next save.
+                    pass
+        return new_manifest
+
+
+class OdPairIndexCache:
+    """
+    The base TAZ pair file converted once into a flat linear index and saved as
+    a memory-mapped .npy next to it, keyed by the file's content hash and the
+    zone count of the OMX matrices. Later runs skip parsing the CSV entirely.
+    """
+
+    META_NAME = 'index.json'
+
+    def __init__(self, base_path):
+        """
+        Args:
+            base_path (str): Path of the base TAZ pair CSV.
+        """
+        self.base_path = base_path
+        self.cache_dir = f"{base_path}.odindex"
+        self.meta_path = os.path.join(self.cache_dir, self.META_NAME)
+
+    def load(self, n_zones):
+        """
+        Returns the pair index for the base file, building and saving it first
+        if the file changed or the zone count differs.
+
+        Returns:
+            tuple: (pair_index, index_path) with pair_index memory-mapped from index_path.
+        """
+        try:
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            meta = {}
+        fingerprint = _file_fingerprint(self.base_path, meta.get('base'))
+        file_name = f"pairs_{fingerprint['hash']}_{n_zones}.npy"
+        index_path = os.path.join(self.cache_dir, file_name)
+
+        if os.path.exists(index_path):
+            print(f"Loading cached OD pair index: {index_path}")
+        else:
+            print(f"Building OD pair index for {n_zones} zones from base file: {self.base_path}")
+            # We only need the first two columns (TAZ from/to)
+            pairs = pd.read_csv(self.base_path, header=None, usecols=[0, 1], dtype=np.int32)
+            pair_index = _flat_pair_index(pairs[0].to_numpy(), pairs[1].to_numpy(), n_zones)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{index_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, pair_index)
+            os.replace(tmp_path, index_path)
+            for old_name in os.listdir(self.cache_dir):
+                if old_name.startswith('pairs_') and old_name != file_name:
+                    try:
+                        os.remove(os.path.join(self.cache_dir, old_name))
+                    except OSError:
+                        pass
+
+        if meta.get('base') != fingerprint or meta.get('file') != file_name:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self.meta_path, 'w') as f:
+                json.dump({'base': fingerprint, 'n_zones': n_zones, 'file': file_name}, f, indent=2)
+        return np.load(index_path, mmap_mode='r'), index_path
+
 
 class SkimFileBuilder:
     """
     A class to efficiently build a skim file by reading TAZ pairs from a base file,
     looking up values in OMX matrices using fast, full-matrix loading, and writing
     the results to a CSV file. The process is controlled by a JSON configuration file.
+
+    Setting "extraction_mode" to "streaming" in the configuration reads each matrix
+    in row blocks sized to "memory_budget_mb" instead of loading it whole.
     """
 
-    def __init__(self, config_path):
+    DEFAULT_MEMORY_BUDGET_MB = 256
+
+    def __init__(self, config_path, max_workers=None):
         """
         Initializes the SkimFileBuilder with a configuration file.
 
         Args:
             config_path (str): The file path for the JSON configuration.
+            max_workers (int, optional): Number of worker processes used to read
+                matrices. Overrides "max_workers" in the configuration; 1 runs serially.
         """
         print(f"Initializing builder with configuration: {config_path}")
         self.config_path = config_path
         self.config = self._load_config()
         self.df = None
+        self.max_workers = int(max_workers or self.config.get('max_workers', 1))
+        self.column_copies = 0
+        # Seconds spent in the 'load', 'extract' and 'save' phases of the last run.
+        self.phase_times = {}
+        self.last_output_bytes = 0
+        self.store = None
+        if self.config.get('use_sidecar_store', True):
+            self.store = SkimSidecarStore(f"{self.config['output_csv_path']}.store")
+        self._manifest = None
+        self.pair_index_cache = OdPairIndexCache(self.config['base_taz_pair_file'])
+        # Flat pair index of the base file, when the DataFrame was created from it.
+        self._pair_index = None
+        self._pair_index_path = None
+        # Column index -> fingerprint of the OMX matrix the column was built from.
+        self._column_sources = {}
+        # Columns that differ from the sidecar store, and whether the CSV must be rewritten.
+        self._changed_columns = set()
+        self._sources_refreshed = False
+        self._csv_stale = False
 
     def _load_config(self):
         """Loads and validates the JSON configuration file."""
@@ -46,14 +774,38 @@ class SkimFileBuilder:
             print(f"ERROR: {e}")
             raise
 
-    def _load_or_create_dataframe(self):
+    def _load_or_create_dataframe(self, n_zones=None):
         """
-        Loads the output CSV if it exists, otherwise creates a new DataFrame
-        from the base TAZ pair file.
+        Loads the skim table from the sidecar store when it is in step with the
+        output CSV (or the CSV is missing), from the output CSV if it exists,
+        otherwise creates a new DataFrame from the base TAZ pair file.
+
+        Args:
+            n_zones (int, optional): Zone count of the OMX matrices. When given, a
+                new DataFrame is built from the cached OD pair index of the base file.
         """
         output_path = self.config['output_csv_path']
         base_path = self.config['base_taz_pair_file']
+        self._manifest = self.store.load_manifest() if self.store else None
+        self._column_sources = {}
+        self._changed_columns = set()
+        self._sources_refreshed = False
+        self._csv_stale = False
+        self._pair_index = None
+        self._pair_index_path = None
+
+        if self._manifest and (SkimSidecarStore.matches_csv(self._manifest, output_path)
+                               or not os.path.exists(output_path)):
+            print(f"Loading data from sidecar store: {self.store.store_dir}")
+            self.df = self.store.load_dataframe(self._manifest)
+            self._column_sources = {
+                int(col): entry['source'] for col, entry in self._manifest['columns'].items() if 'source' in entry
+            }
+            self._csv_stale = not os.path.exists(output_path)
+            return
 
+        # Without a usable store, every column has to be written to a new one.
+        self._manifest = None
         if os.path.exists(output_path):
             print(f"Found existing output file. Loading data from: {output_path}")
             # Use smaller dtypes to reduce memory usage
@@ -64,14 +816,29 @@ class SkimFileBuilder:
         else:
             print(f"Output file not found. Creating new DataFrame from base file: {base_path}")
             try:
-                # We only need the first two columns (TAZ from/to)
-                self.df = pd.read_csv(base_path, header=None, usecols=[0, 1], dtype=np.int32)
+                if n_zones:
+                    self._pair_index, self._pair_index_path = self.pair_index_cache.load(n_zones)
+                    orig_indexes, dest_indexes = np.divmod(self._pair_index, n_zones)
+                    self.df = pd.DataFrame({
+                        0: (orig_indexes + 1).astype(np.int32),
+                        1: (dest_indexes + 1).astype(np.int32),
+                    })
+                else:
+                    # We only need the first two columns (TAZ from/to)
+                    self.df = pd.read_csv(base_path, header=None, usecols=[0, 1], dtype=np.int32)
             except FileNotFoundError:
                 print(f"ERROR: The base TAZ pair file was not found at {base_path}")
                 raise
+            except ValueError as e:
+                # TAZ IDs outside the OMX matrices: report them before any matrix is read.
+                print(f"ERROR: {e}")
+                self.df = None
+                return
             except Exception as e:
                 print(f"ERROR: Could not read the base TAZ file: {e}")
                 raise
+            self._csv_stale = True
+        self._changed_columns = set(self.df.columns)
 
     def _ensure_columns_exist(self, max_col_index):
         """
@@ -82,90 +849,438 @@ class SkimFileBuilder:
         if max_col_index > current_max_index:
             print(f"Expanding DataFrame columns up to index {max_col_index}.")
             for i in range(current_max_index + 1, max_col_index + 1):
-                self.df[i] = np.nan
-            # Cast new columns to a memory-efficient float type
-            self.df = self.df.astype({i: np.float32 for i in range(current_max_index + 1, max_col_index + 1)})
-
+                # New columns use a memory-efficient float type; assigning them one by
+                # one leaves existing (possibly memory-mapped) columns uncopied.
+                self.df[i] = np.full(len(self.df), np.nan, dtype=np.float32)
+                self._changed_columns.add(i)
+                self._csv_stale = True
+
+
+    @staticmethod
+    def _config_omx_paths(omx_config):
+        """Returns the OMX files used by a configuration entry (all aliases for an expression)."""
+        if 'expr' in omx_config:
+            return list(omx_config.get('omx_aliases', {}).values())
+        return [omx_config['omx_file_path']]
+
+    def _matrix_zone_count(self):
+        """Returns the zone count of the first configured OMX file found, or None."""
+        for omx_config in self.config['omx_configs']:
+            for omx_path in self._config_omx_paths(omx_config):
+                if os.path.exists(omx_path):
+                    with omx.open_file(omx_path, 'r') as omx_file:
+                        return int(omx_file.shape()[0])
+        return None
 
-    def process_skims(self):
-        """
-        Main processing function. It iterates through the OMX configurations,
-        reads matrices efficiently, and populates the DataFrame.
+    def _extract_matrix_values(self, omx_handle, matrix_name, pair_index, origin_plan=None):
         """
-        print("\n--- Starting Efficient Skim Processing ---")
-        start_time = time.time()
-        self._load_or_create_dataframe()
+        Gathers the matrix value for every TAZ pair.
 
-        if self.df is None:
-            print("ERROR: DataFrame could not be loaded. Aborting process.")
-            return
+        In "full" mode the entire matrix is read and indexed in one operation,
+        then freed. In "streaming" mode the matrix is read in
+        row blocks and each block's values are scattered into the output, which
+        keeps peak memory bounded by "memory_budget_mb" and gives the same result
+        as the full read.
 
-        # Get the origin and destination TAZs once as NumPy arrays for speed.
-        # TAZs in the file are 1-indexed, so we subtract 1 for 0-based lookup.
-        try:
-            orig_indexes = self.df[0].values - 1
-            dest_indexes = self.df[1].values - 1
-        except (KeyError, IndexError):
-            print("ERROR: DataFrame does not have the required origin/destination TAZ columns (0 and 1).")
-            return
+        Args:
+            omx_handle (_LazyOmxFile): The OMX file, opened on first use.
+            matrix_name (str): Name of the matrix within the OMX file.
+            pair_index (np.ndarray): Flat linear index of every TAZ pair.
+            origin_plan (tuple): Output of _build_origin_plan, required for streaming.
+
+        Returns:
+            np.ndarray: The gathered values in the matrix's own dtype.
+        """
+        if origin_plan is None:
+            # 1. Read the ENTIRE matrix into a NumPy array.
+            matrix_data = omx_handle.file[matrix_name].read()
+            # 2. Look up all TAZ pairs in ONE take() on the flattened matrix.
+            return _take_pairs(matrix_data, pair_index)
+
+        memory_budget_mb = self.config.get('memory_budget_mb', self.DEFAULT_MEMORY_BUDGET_MB)
+        return _stream_gather(omx_handle.file[matrix_name], origin_plan, memory_budget_mb)
 
-        # Iterate over each OMX file configuration
+    def _plan_matrix_reads(self, n_zones=None):
+        """
+        Walks the OMX configurations in order and works out which matrix or
+        expression ends up in each output column. A column mapped more than once
+        keeps the last mapping, exactly as if the configurations were applied one
+        after another. Files whose matrices are not n_zones x n_zones, and
+        invalid expressions, are skipped with a warning.
+
+        When the sidecar store is enabled, matrices whose columns were already
+        built from the same OMX content are left out, so only stale columns are
+        recomputed.
+
+        Returns:
+            dict: Maps each matrix source key to a dict with its 'omx_path',
+                  'matrix_name', the output 'columns' it fills and its 'source'
+                  fingerprint (None without a store), in first-seen order.
+                  Expression columns are keyed ('expr', column) and carry the
+                  parsed 'expression' and its 'omx_aliases' instead.
+        """
+        column_sources = {}
         for omx_config in self.config['omx_configs']:
+            if 'expr' in omx_config:
+                expression_read = self._plan_expression(omx_config, n_zones)
+                if expression_read is not None:
+                    column_sources[expression_read['columns'][0]] = (
+                        ('expr', expression_read['columns'][0]), expression_read
+                    )
+                continue
             omx_path = omx_config['omx_file_path']
             mappings = omx_config['matrix_to_column_index']
             print(f"\nProcessing OMX file: {omx_path}")
 
-            try:
+            if not os.path.exists(omx_path):
+                print(f"  WARNING: OMX file not found at {omx_path}. Skipping this configuration.")
+                continue
+            if n_zones:
                 with omx.open_file(omx_path, 'r') as omx_file:
-                    max_col_needed = max(mappings.values())
-                    self._ensure_columns_exist(max_col_needed)
+                    shape = tuple(omx_file.shape())
+                if shape != (n_zones, n_zones):
+                    print(f"  WARNING: Matrices in {omx_path} are {shape}, expected ({n_zones}, {n_zones}). "
+                          "Skipping this configuration.")
+                    continue
+
+            self._ensure_columns_exist(max(mappings.values()))
+            for matrix_name, col_index in mappings.items():
+                print(f"  - Mapping matrix '{matrix_name}' to column {col_index}.")
+                column_sources[col_index] = (MatrixCache.source_key(omx_path, matrix_name), omx_path, matrix_name)
+
+        reads = {}
+        for col_index, column_source in column_sources.items():
+            if column_source[0][0] == 'expr':
+                reads[column_source[0]] = column_source[1]
+                continue
+            cache_key, omx_path, matrix_name = column_source
+            read = reads.setdefault(
+                cache_key, {'omx_path': omx_path, 'matrix_name': matrix_name, 'columns': [], 'source': None}
+            )
+            read['columns'].append(col_index)
+        if self.store is None:
+            return reads
+
+        # Compare each matrix's OMX content with what its columns were built from.
+        previous_fingerprints = {}
+        for source in self._column_sources.values():
+            for file_source in source.get('operands', [source]):
+                previous_fingerprints[file_source['path']] = file_source
+        fingerprints = {}
+
+        def fingerprint_of(omx_path):
+            resolved_path = os.path.realpath(omx_path)
+            if resolved_path not in fingerprints:
+                fingerprints[resolved_path] = _file_fingerprint(resolved_path, previous_fingerprints.get(resolved_path))
+            return {key: fingerprints[resolved_path][key] for key in ('path', 'size', 'mtime_ns', 'hash')}
+
+        stale_reads = {}
+        for cache_key, read in reads.items():
+            if 'expression' in read:
+                read['source'] = {
+                    'expr': read['expression'].text,
+                    'operands': [
+                        {**fingerprint_of(read['omx_aliases'][alias]), 'alias': alias, 'matrix_name': matrix_name}
+                        for alias, matrix_name in read['expression'].operands
+                    ],
+                }
+            else:
+                read['source'] = {**fingerprint_of(read['omx_path']), 'matrix_name': read['matrix_name']}
+            is_fresh = all(
+                col not in self._changed_columns
+                and self._same_source(self._column_sources.get(col), read['source'])
+                for col in read['columns']
+            )
+            if is_fresh:
+                for col in read['columns']:
+                    if self._column_sources[col] != read['source']:
+                        # Touched but unchanged: record the new mtime so it is not hashed again.
+                        self._column_sources[col] = read['source']
+                        self._sources_refreshed = True
+                print(f"  - {self._describe_read(read)} is unchanged; keeping columns {read['columns']}.")
+            else:
+                stale_reads[cache_key] = read
+        return stale_reads
+
+    def _plan_expression(self, omx_config, n_zones=None):
+        """
+        Parses an expression configuration entry, e.g.
+        {"omx_aliases": {"am": "hwy_am.omx", "pm": "hwy_pm.omx"},
+         "expr": "0.5*(am.da_time+pm.da_time)", "column_index": 4}.
 
-                    # Process each matrix mapping for the current OMX file
-                    for matrix_name, col_index in mappings.items():
-                        print(f"  - Mapping matrix '{matrix_name}' to column {col_index}...", end="", flush=True)
-                        try:
-                            # --- EFFICIENT BATCH LOGIC ---
-                            # 1. Read the ENTIRE matrix into a NumPy array.
-                            matrix_data = omx_file[matrix_name].read()
+        Returns:
+            dict: The planned read for the expression column, or None (with a
+                  warning) if the entry is invalid or its OMX files are unusable.
+        """
+        aliases = omx_config.get('omx_aliases', {})
+        col_index = omx_config.get('column_index')
+        print(f"\nProcessing expression: {omx_config['expr']}")
+        if not isinstance(col_index, int):
+            print("  WARNING: Expression configurations need an integer 'column_index'. Skipping this configuration.")
+            return None
+        try:
+            expression = SkimExpression(omx_config['expr'], aliases)
+        except ValueError as e:
+            print(f"  WARNING: {e} Skipping this configuration.")
+            return None
+
+        for alias in {alias for alias, _ in expression.operands}:
+            omx_path = aliases[alias]
+            if not os.path.exists(omx_path):
+                print(f"  WARNING: OMX file not found at {omx_path} (alias '{alias}'). Skipping this configuration.")
+                return None
+            if n_zones:
+                with omx.open_file(omx_path, 'r') as omx_file:
+                    shape = tuple(omx_file.shape())
+                if shape != (n_zones, n_zones):
+                    print(f"  WARNING: Matrices in {omx_path} are {shape}, expected ({n_zones}, {n_zones}). "
+                          "Skipping this configuration.")
+                    return None
+
+        self._ensure_columns_exist(col_index)
+        print(f"  - Mapping expression to column {col_index}.")
+        return {'expression': expression, 'omx_aliases': aliases, 'columns': [col_index], 'source': None}
+
+    @staticmethod
+    def _describe_read(read):
+        """Names a planned read in progress messages."""
+        if 'expression' in read:
+            return f"Expression '{read['expression'].text}'"
+        return f"Matrix '{read['matrix_name']}' from {read['omx_path']}"
+
+    @staticmethod
+    def _same_source(recorded, current):
+        """True if a column recorded as built from `recorded` needs no rebuild for `current`."""
+        if not recorded:
+            return False
+        if 'expr' in recorded or 'expr' in current:
+            # Same expression over the same matrices with the same content.
+            operand_keys = ('path', 'alias', 'matrix_name', 'hash')
+            return recorded.get('expr') == current.get('expr') and (
+                [[operand.get(k) for k in operand_keys] for operand in recorded.get('operands', [])]
+                == [[operand.get(k) for k in operand_keys] for operand in current.get('operands', [])]
+            )
+        return all(recorded.get(k) == current.get(k) for k in ('path', 'matrix_name', 'hash'))
+
+    def _assign_columns(self, read, values):
+        """Writes one matrix's gathered values into every column that maps to it."""
+        first_col, *other_cols = read['columns']
+        self.df[first_col] = values
+        for col_index in other_cols:
+            self.df[col_index] = values.copy()
+            self.column_copies += 1
+        for col_index in read['columns']:
+            self._changed_columns.add(col_index)
+            if read['source'] is not None:
+                self._column_sources[col_index] = read['source']
+        self._csv_stale = True
+
+    def _gather_serial(self, reads, pair_index, origin_plan):
+        """Reads each planned matrix in this process, one after another."""
+        for cache_key, read in reads.items():
+            omx_path, matrix_name = read['omx_path'], read['matrix_name']
+            print(f"  - Reading matrix '{matrix_name}' from {omx_path} into columns {read['columns']}...", end="", flush=True)
+            try:
+                with _LazyOmxFile(omx_path) as omx_handle:
+                    values = self._extract_matrix_values(
+                        omx_handle, matrix_name, pair_index, origin_plan
+                    )
+                self._assign_columns(read, _round_skim_values(values))
+                print(" Done.")
+            except KeyError:
+                print(f"\n    WARNING: Matrix '{matrix_name}' not found in {omx_path}. Skipping.")
+            except Exception as e:
+                print(f"\n    ERROR: An unexpected error occurred while processing matrix '{matrix_name}': {e}")
 
-                            # 2. Use advanced indexing to get all values in ONE operation.
-                            values = matrix_data[orig_indexes, dest_indexes]
+    def _evaluate_expressions(self, reads, origin_plan):
+        """
+        Computes each planned expression column in one pass over its matrices.
+        Expressions are evaluated in this process after the plain matrices.
+        """
+        memory_budget_mb = self.config.get('memory_budget_mb', self.DEFAULT_MEMORY_BUDGET_MB)
+        for read in reads:
+            expression = read['expression']
+            print(f"  - Evaluating '{expression.text}' into column {read['columns'][0]}...", end="", flush=True)
+            omx_files = {}
+            try:
+                for alias in {alias for alias, _ in expression.operands}:
+                    omx_files[alias] = omx.open_file(read['omx_aliases'][alias], 'r')
+                matrix_nodes = {
+                    (alias, matrix_name): omx_files[alias][matrix_name]
+                    for alias, matrix_name in expression.operands
+                }
+                values = _stream_evaluate(matrix_nodes, expression, origin_plan, memory_budget_mb)
+                self._assign_columns(read, _round_skim_values(values))
+                print(" Done.")
+            except KeyError as e:
+                print(f"\n    WARNING: Matrix {e} used in '{expression.text}' was not found. Skipping.")
+            except Exception as e:
+                print(f"\n    ERROR: An unexpected error occurred while evaluating '{expression.text}': {e}")
+            finally:
+                for omx_file in omx_files.values():
+                    omx_file.close()
 
-                            # 3. Assign the values to the DataFrame column.
-                            self.df[col_index] = np.round(values.astype(np.float32), 2)
-                            # self.df[col_index] = np.round(values, 2)
+    def _gather_parallel(self, reads, pair_index, origin_plan):
+        """
+        Reads the planned matrices on a pool of worker processes. Each result is
+        written only to the columns planned for it, so the output does not depend
+        on the number of workers or the order in which matrices finish.
+        """
+        memory_budget_mb = self.config.get('memory_budget_mb', self.DEFAULT_MEMORY_BUDGET_MB)
+        if origin_plan is not None:
+            # Streaming workers only need the plan.
+            worker_pair_index = None
+        elif pair_index is self._pair_index and self._pair_index_path:
+            # Workers memory-map the cached index instead of receiving a copy.
+            worker_pair_index = self._pair_index_path
+        else:
+            worker_pair_index = pair_index
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=_init_gather_worker,
+            initargs=(worker_pair_index, origin_plan, memory_budget_mb),
+        ) as executor:
+            futures = {
+                executor.submit(_gather_in_worker, read['omx_path'], read['matrix_name']): read
+                for read in reads.values()
+            }
+            for future in as_completed(futures):
+                read = futures[future]
+                omx_path, matrix_name = read['omx_path'], read['matrix_name']
+                try:
+                    self._assign_columns(read, future.result())
+                    print(f"  - Matrix '{matrix_name}' from {omx_path} written to columns {read['columns']}.")
+                except KeyError:
+                    print(f"    WARNING: Matrix '{matrix_name}' not found in {omx_path}. Skipping.")
+                except Exception as e:
+                    print(f"    ERROR: An unexpected error occurred while processing matrix '{matrix_name}': {e}")
 
-                            # --- END OF EFFICIENT LOGIC ---
-                            print(" Done.")
+    def process_skims(self):
+        """
+        Main processing function. It iterates through the OMX configurations,
+        reads matrices efficiently, and populates the DataFrame.
 
-                        except KeyError:
-                            print(f"\n    WARNING: Matrix '{matrix_name}' not found in {omx_path}. Skipping.")
-                        except Exception as e:
-                            print(f"\n    ERROR: An unexpected error occurred while processing matrix '{matrix_name}': {e}")
+        Each distinct matrix is read once, on a pool of "max_workers" processes
+        when more than one worker is configured.
+        """
+        print("\n--- Starting Efficient Skim Processing ---")
+        start_time = time.time()
+        n_zones = self._matrix_zone_count()
+        self._load_or_create_dataframe(n_zones)
+        self.phase_times['load'] = time.time() - start_time
+
+        if self.df is None:
+            print("ERROR: DataFrame could not be loaded. Aborting process.")
+            return
+
+        # Convert the TAZ pairs once into a flat index into the zone x zone matrices,
+        # checking up front that every TAZ exists in them.
+        pair_index = self._pair_index
+        if n_zones is None:
+            print("WARNING: None of the configured OMX files were found. No skim columns can be updated.")
+        elif pair_index is None:
+            try:
+                pair_index = _flat_pair_index(self.df[0].to_numpy(), self.df[1].to_numpy(), n_zones)
+            except (KeyError, IndexError):
+                print("ERROR: DataFrame does not have the required origin/destination TAZ columns (0 and 1).")
+                return
+            except ValueError as e:
+                print(f"ERROR: {e}")
+                return
+
+        extraction_mode = self.config.get('extraction_mode', 'full')
+        origin_plan = None
+        if extraction_mode == 'streaming' and pair_index is not None:
+            budget_mb = self.config.get('memory_budget_mb', self.DEFAULT_MEMORY_BUDGET_MB)
+            print(f"Using streaming extraction with a {budget_mb} MB memory budget per matrix block.")
+            origin_plan = _build_origin_plan(pair_index, n_zones)
+        elif extraction_mode not in ('full', 'streaming'):
+            print(f"WARNING: Unknown extraction_mode '{extraction_mode}'. Falling back to 'full'.")
+
+        self.column_copies = 0
+
+        # Track the peak memory of the extraction itself (NumPy buffers included).
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        elif hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+            tracemalloc.reset_peak()
+
+        reads = self._plan_matrix_reads(n_zones)
+        expression_reads = [read for read in reads.values() if 'expression' in read]
+        reads = {key: read for key, read in reads.items() if 'expression' not in read}
+        workers = min(self.max_workers, len(reads))
+        if not reads and not expression_reads:
+            print("\nAll skim columns are up to date.")
+        elif reads:
+            print(f"\nGathering {len(reads)} distinct matrices with {max(workers, 1)} worker(s)...")
+        if workers > 1:
+            self._gather_parallel(reads, pair_index, origin_plan)
+        else:
+            self._gather_serial(reads, pair_index, origin_plan)
+        if expression_reads:
+            print(f"\nEvaluating {len(expression_reads)} expression column(s)...")
+            if origin_plan is None:
+                origin_plan = _build_origin_plan(pair_index, n_zones)
+            self._evaluate_expressions(expression_reads, origin_plan)
 
-            except FileNotFoundError:
-                print(f"  WARNING: OMX file not found at {omx_path}. Skipping this configuration.")
-                continue
-            except Exception as e:
-                print(f"  ERROR: Could not open or process OMX file {omx_path}: {e}")
-                continue
-        
         end_time = time.time()
+        self.phase_times['extract'] = end_time - start_time - self.phase_times['load']
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        if started_tracing:
+            tracemalloc.stop()
         print(f"\n--- Skim Processing Complete in {end_time - start_time:.2f} seconds ---")
+        print(f"Peak memory allocated during extraction: {peak_bytes / 1024 ** 2:,.1f} MB")
+        print(f"{self.column_copies} columns copied from already gathered matrices.")
 
     def save_output(self):
-        """Saves the processed DataFrame to the output CSV file."""
+        """
+        Saves the processed DataFrame to the output CSV file, then brings the
+        sidecar store up to date. The CSV is only rewritten when a column changed.
+        """
         if self.df is not None:
             output_path = self.config['output_csv_path']
+            if not self._csv_stale and os.path.exists(output_path):
+                print(f"\nOutput is up to date; not rewriting {output_path}.")
+                self.phase_times['save'] = 0.0
+                self.last_output_bytes = 0
+                self._save_store(output_path)
+                return
             print(f"\nSaving processed data to: {output_path}")
             start_time = time.time()
-            # The output file can be large, so this step may take time.
-            self.df.to_csv(output_path, index=False, header=False) #, float_format='%.2f')
+            # The output file can be large, so rows are formatted in bulk chunks.
+            bytes_written = write_skim_csv(
+                self.df, output_path,
+                decimals=self.config.get('csv_float_decimals', 2),
+                workers=self.max_workers,
+            )
             end_time = time.time()
-            print(f"Save complete in {end_time - start_time:.2f} seconds.")
+            self.phase_times['save'] = end_time - start_time
+            self.last_output_bytes = bytes_written
+            elapsed = max(end_time - start_time, 1e-9)
+            print(f"Save complete in {end_time - start_time:.2f} seconds "
+                  f"({bytes_written / 1024 ** 2:,.1f} MB, {bytes_written / 1024 ** 2 / elapsed:,.1f} MB/s).")
+            self._csv_stale = False
+            # The CSV changed, so the manifest must record its new size and time.
+            self._save_store(output_path, force=True)
         else:
             print("WARNING: DataFrame is not available to save. Did processing fail?")
 
+    def _save_store(self, output_path, force=False):
+        """Writes changed columns and the manifest to the sidecar store, if enabled."""
+        if self.store is None or not (force or self._changed_columns or self._sources_refreshed
+                                      or self._manifest is None):
+            return
+        try:
+            self._manifest = self.store.save(
+                self.df, self._manifest, self._changed_columns, self._column_sources, output_path
+            )
+            self._changed_columns = set()
+            self._sources_refreshed = False
+            print(f"Sidecar store updated: {self.store.store_dir}")
+        except Exception as e:
+            print(f"WARNING: Could not update the sidecar store {self.store.store_dir}: {e}")
+
     def verify_output(self):
         """Prints the head and tail of the DataFrame for verification."""
         if self.df is not None:
@@ -178,6 +1293,326 @@ class SkimFileBuilder:
             print("WARNING: DataFrame is not available for verification.")
 
 
+class SkimLookup:
+    """
+    Serves batched (orig, dest) queries against OMX skims without running the
+    builder or reading whole matrices.
+
+    Each OMX file is opened once. A query is grouped by the row blocks its
+    origins fall in, with blocks aligned to the matrix's HDF5 chunk rows (the
+    unit HDF5 decompresses anyway), and each needed block is read once and
+    kept in a small least-recently-used cache for the next query.
+    """
+
+    def __init__(self, omx_files, cache_mb=256):
+        """
+        Args:
+            omx_files (str or dict): An OMX file path, or a dict of alias -> path.
+            cache_mb (float): Maximum memory, in megabytes, of cached row blocks.
+        """
+        if isinstance(omx_files, str):
+            omx_files = {os.path.splitext(os.path.basename(omx_files))[0]: omx_files}
+        self.omx_paths = dict(omx_files)
+        self.block_cache = MatrixCache(cache_mb)
+        self._files = {}
+        self.n_zones = None
+        for alias, omx_path in self.omx_paths.items():
+            omx_file = omx.open_file(omx_path, 'r')
+            self._files[alias] = omx_file
+            shape = tuple(int(size) for size in omx_file.shape())
+            if self.n_zones is None:
+                self.n_zones = shape[0]
+            if shape != (self.n_zones, self.n_zones):
+                self.close()
+                raise ValueError(f"Matrices in {omx_path} are {shape}, expected ({self.n_zones}, {self.n_zones}).")
+
+    def _resolve(self, matrix):
+        """Splits 'alias.matrix' (or a bare matrix name with a single file) into (alias, matrix name)."""
+        alias, _, matrix_name = matrix.partition('.')
+        if matrix_name and alias in self._files:
+            return alias, matrix_name
+        if len(self._files) == 1:
+            return next(iter(self._files)), matrix
+        raise KeyError(f"Matrix '{matrix}' must be given as alias.matrix, with alias one of {sorted(self._files)}.")
+
+    @staticmethod
+    def _block_rows(matrix_node):
+        """Rows per cached block: the HDF5 chunk rows, or about 1 MB of rows for contiguous matrices."""
+        chunkshape = getattr(matrix_node, 'chunkshape', None)
+        if chunkshape:
+            return int(chunkshape[0])
+        return max(1, (1024 ** 2) // (int(matrix_node.shape[1]) * matrix_node.dtype.itemsize))
+
+    def _lookup_matrix(self, alias, matrix_name, orig_indexes, dest_indexes):
+        """Gathers one matrix's values for 0-based origin/destination indexes."""
+        matrix_node = self._files[alias][matrix_name]
+        block_rows = self._block_rows(matrix_node)
+        values = np.empty(len(orig_indexes), dtype=matrix_node.dtype)
+        block_ids = orig_indexes // block_rows
+        order = np.argsort(block_ids, kind='stable')
+        boundaries = np.flatnonzero(np.diff(block_ids[order])) + 1
+        for group in np.split(order, boundaries):
+            if not len(group):
+                continue
+            row_start = int(block_ids[group[0]]) * block_rows
+            key = (self.omx_paths[alias], matrix_name, row_start)
+            block = self.block_cache.get(key)
+            if block is None:
+                block = matrix_node[row_start:min(row_start + block_rows, self.n_zones)]
+                self.block_cache.put(key, block)
+            values[group] = block[orig_indexes[group] - row_start, dest_indexes[group]]
+        return values
+
+    def lookup(self, orig, dest, matrices):
+        """
+        Looks up skim values for a batch of OD pairs.
+
+        Args:
+            orig (array-like): 1-based origin TAZs.
+            dest (array-like): 1-based destination TAZs.
+            matrices (list): Matrices to look up, as 'alias.matrix' (or just the
+                matrix name when a single OMX file is open).
+
+        Returns:
+            pd.DataFrame: 'orig', 'dest' and one column per requested matrix, in query order.
+
+        Raises:
+            ValueError: If any TAZ lies outside the matrices.
+            KeyError: If a matrix or alias does not exist.
+        """
+        orig = np.asarray(orig, dtype=np.int64)
+        dest = np.asarray(dest, dtype=np.int64)
+        orig_indexes, dest_indexes = np.divmod(_flat_pair_index(orig, dest, self.n_zones), self.n_zones)
+        result = {'orig': orig, 'dest': dest}
+        for matrix in matrices:
+            alias, matrix_name = self._resolve(matrix)
+            result[matrix] = self._lookup_matrix(alias, matrix_name, orig_indexes, dest_indexes)
+        return pd.DataFrame(result)
+
+    def close(self):
+        """Closes every OMX file and drops the cached blocks."""
+        for omx_file in self._files.values():
+            omx_file.close()
+        self._files = {}
+        self.block_cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _read_od_pairs(pairs_path):
+    """Reads origin/destination TAZs from the first two columns of a CSV, with or without a header row."""
+    pairs = pd.read_csv(pairs_path, header=None, usecols=[0, 1])
+    if not all(pd.api.types.is_integer_dtype(dtype) for dtype in pairs.dtypes):
+        pairs = pd.read_csv(pairs_path, usecols=[0, 1])
+        pairs.columns = [0, 1]
+    return pairs[0].to_numpy(), pairs[1].to_numpy()
+
+
+def compare_skim_files(path_a, path_b, tolerance=0.01, chunk_rows=1_000_000, worst_k=10):
+    """
+    Compares two skim CSVs row by row without loading either file whole.
+
+    Both files are read in aligned chunks of chunk_rows rows, so memory stays
+    bounded for multi-GB files. Rows whose origin/destination TAZ (columns 0
+    and 1) differ are counted as misaligned and left out of the value statistics.
+
+    Args:
+        path_a (str): First skim CSV (e.g. the newly built file).
+        path_b (str): Second skim CSV (e.g. the original).
+        tolerance (float): Absolute difference above which a value counts as different.
+        chunk_rows (int): Rows read from each file per chunk.
+        worst_k (int): Number of largest differences to keep.
+
+    Returns:
+        dict: 'rows_a', 'rows_b', 'columns_a', 'columns_b', 'misaligned_rows',
+              'misaligned_examples', per-column stats under 'columns' and the
+              largest differences under 'worst_pairs'.
+    """
+    reader_a = pd.read_csv(path_a, header=None, chunksize=chunk_rows, dtype=np.float64)
+    reader_b = pd.read_csv(path_b, header=None, chunksize=chunk_rows, dtype=np.float64)
+    report = {
+        'file_a': path_a, 'file_b': path_b, 'tolerance': tolerance,
+        'rows_a': 0, 'rows_b': 0, 'columns_a': None, 'columns_b': None,
+        'misaligned_rows': 0, 'misaligned_examples': [], 'columns': {}, 'worst_pairs': [],
+    }
+    worst = []  # min-heap of (abs_diff, row, column, orig, dest, value_a, value_b)
+    carry_a = carry_b = None
+    row_offset = 0
+    exhausted_a = exhausted_b = False
+
+    while True:
+        # Keep the two readers aligned on row numbers even if their chunks differ in length.
+        if carry_a is None and not exhausted_a:
+            carry_a = next(reader_a, None)
+            exhausted_a = carry_a is None
+        if carry_b is None and not exhausted_b:
+            carry_b = next(reader_b, None)
+            exhausted_b = carry_b is None
+        if carry_a is None or carry_b is None:
+            break
+
+        n_rows = min(len(carry_a), len(carry_b))
+        block_a, carry_a = carry_a.iloc[:n_rows], (carry_a.iloc[n_rows:] if n_rows < len(carry_a) else None)
+        block_b, carry_b = carry_b.iloc[:n_rows], (carry_b.iloc[n_rows:] if n_rows < len(carry_b) else None)
+        values_a, values_b = block_a.to_numpy(), block_b.to_numpy()
+        report['columns_a'] = values_a.shape[1]
+        report['columns_b'] = values_b.shape[1]
+
+        aligned = (values_a[:, 0] == values_b[:, 0]) & (values_a[:, 1] == values_b[:, 1])
+        misaligned_rows = np.flatnonzero(~aligned)
+        report['misaligned_rows'] += len(misaligned_rows)
+        for row in misaligned_rows[:max(0, 5 - len(report['misaligned_examples']))]:
+            report['misaligned_examples'].append({
+                'row': int(row_offset + row + 1),
+                'a': [int(values_a[row, 0]), int(values_a[row, 1])],
+                'b': [int(values_b[row, 0]), int(values_b[row, 1])],
+            })
+
+        n_common = min(values_a.shape[1], values_b.shape[1])
+        for col in range(2, n_common):
+            col_a, col_b = values_a[aligned, col], values_b[aligned, col]
+            nan_a, nan_b = np.isnan(col_a), np.isnan(col_b)
+            both = ~nan_a & ~nan_b
+            diff = np.abs(col_a[both] - col_b[both])
+            stats = report['columns'].setdefault(col, {
+                'compared': 0, 'sum_abs_diff': 0.0, 'max_abs_diff': 0.0, 'over_tolerance': 0, 'nan_mismatches': 0,
+            })
+            stats['compared'] += len(diff)
+            stats['nan_mismatches'] += int(np.count_nonzero(nan_a != nan_b))
+            if len(diff):
+                stats['sum_abs_diff'] += float(diff.sum())
+                stats['max_abs_diff'] = max(stats['max_abs_diff'], float(diff.max()))
+                stats['over_tolerance'] += int(np.count_nonzero(diff > tolerance))
+
+                # Only the chunk's own top-k can enter the overall top-k; equal values are not listed.
+                candidates = np.argpartition(diff, -min(worst_k, len(diff)))[-worst_k:] if worst_k else []
+                candidates = [c for c in candidates if diff[c] > 0]
+                rows = np.flatnonzero(aligned)[np.flatnonzero(both)[candidates]]
+                for candidate, row in zip(candidates, rows):
+                    entry = (float(diff[candidate]), int(row_offset + row + 1), col,
+                             int(values_a[row, 0]), int(values_a[row, 1]),
+                             float(values_a[row, col]), float(values_b[row, col]))
+                    if len(worst) < worst_k:
+                        heapq.heappush(worst, entry)
+                    elif entry[0] > worst[0][0]:
+                        heapq.heapreplace(worst, entry)
+        row_offset += n_rows
+
+    # Count whatever is left over in the longer file.
+    report['rows_a'] = row_offset + (len(carry_a) if carry_a is not None else 0) + sum(len(c) for c in reader_a)
+    report['rows_b'] = row_offset + (len(carry_b) if carry_b is not None else 0) + sum(len(c) for c in reader_b)
+    for stats in report['columns'].values():
+        stats['mean_abs_diff'] = stats['sum_abs_diff'] / stats['compared'] if stats['compared'] else 0.0
+    report['worst_pairs'] = [
+        {'abs_diff': d, 'row': r, 'column': c, 'orig': o, 'dest': t, 'value_a': a, 'value_b': b}
+        for d, r, c, o, t, a, b in sorted(worst, reverse=True)
+    ]
+    return report
+
+
+def print_skim_comparison(report):
+    """Prints a compare_skim_files report."""
+    print(f"\n--- Skim Comparison: {report['file_a']} vs {report['file_b']} ---")
+    print(f"Rows: {report['rows_a']:,} vs {report['rows_b']:,}; columns: {report['columns_a']} vs {report['columns_b']}")
+    if report['rows_a'] != report['rows_b']:
+        print("WARNING: The files have a different number of rows; only the common rows were compared.")
+    if report['misaligned_rows']:
+        print(f"WARNING: {report['misaligned_rows']:,} rows have different origin/destination TAZs, e.g.:")
+        for example in report['misaligned_examples']:
+            print(f"    row {example['row']}: {example['a']} vs {example['b']}")
+    print(f"\n{'Column':>6} {'Compared':>12} {'Max |diff|':>12} {'Mean |diff|':>12} "
+          f"{'> ' + str(report['tolerance']):>12} {'NaN mismatch':>13}")
+    for col, stats in sorted(report['columns'].items()):
+        print(f"{col:>6} {stats['compared']:>12,} {stats['max_abs_diff']:>12.4f} {stats['mean_abs_diff']:>12.6f} "
+              f"{stats['over_tolerance']:>12,} {stats['nan_mismatches']:>13,}")
+    if report['worst_pairs']:
+        print(f"\nLargest differences:")
+        for pair in report['worst_pairs']:
+            print(f"    row {pair['row']:,} ({pair['orig']}-{pair['dest']}), column {pair['column']}: "
+                  f"{pair['value_a']} vs {pair['value_b']} (|diff| {pair['abs_diff']:.4f})")
+
+
+DEFAULT_CONFIG_FILE = '[UPDATE ME] skim_file_builder_configuration.json'
+
+
+def main():
+    """Parses command line arguments and runs the skim file build or a comparison."""
+    parser = argparse.ArgumentParser(description="Build the STOPS auto skim CSV from OMX matrices.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    build_parser = subparsers.add_parser("build", help="Build the skim CSV (the default command).")
+    build_parser.add_argument("config", nargs="?", default=DEFAULT_CONFIG_FILE,
+                              help="Path to the JSON configuration file.")
+    build_parser.add_argument("--workers", type=int, default=None,
+                              help="Number of worker processes used to read matrices (overrides 'max_workers').")
+
+    verify_parser = subparsers.add_parser("verify", help="Compare two skim CSVs with bounded memory.")
+    verify_parser.add_argument("file_a", help="First skim CSV, e.g. the newly built file.")
+    verify_parser.add_argument("file_b", help="Second skim CSV, e.g. the original.")
+    verify_parser.add_argument("--tolerance", type=float, default=0.01,
+                               help="Absolute difference above which values count as different.")
+    verify_parser.add_argument("--chunk-rows", type=int, default=1_000_000, help="Rows read per chunk.")
+    verify_parser.add_argument("--worst", type=int, default=10, help="Number of largest differences to list.")
+    verify_parser.add_argument("--json", default=None, help="Also write the report to this JSON file.")
+
+    lookup_parser = subparsers.add_parser("lookup", help="Look up skim values for a file of OD pairs.")
+    lookup_parser.add_argument("pairs_file", help="CSV with origin and destination TAZ in its first two columns.")
+    lookup_parser.add_argument("--omx", nargs="+", required=True,
+                               help="OMX files, as alias=path or just path (alias is then the file name).")
+    lookup_parser.add_argument("--matrices", nargs="+", required=True,
+                               help="Matrices to look up, as alias.matrix (or the matrix name with one OMX file).")
+    lookup_parser.add_argument("--output", default=None, help="Write the results to this CSV instead of printing them.")
+    lookup_parser.add_argument("--cache-mb", type=float, default=256, help="Memory for cached matrix row blocks.")
+
+    # "build" is the default, so `python skims_file_builder.py config.json` keeps working.
+    argv = sys.argv[1:]
+    if not argv or argv[0] not in ("build", "verify", "lookup", "-h", "--help"):
+        argv = ["build"] + argv
+    args = parser.parse_args(argv)
+
+    if args.command == "verify":
+        report = compare_skim_files(args.file_a, args.file_b, args.tolerance, args.chunk_rows, args.worst)
+        print_skim_comparison(report)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+        return
+
+    if args.command == "lookup":
+        start_time = time.time()
+        omx_files = {}
+        for entry in args.omx:
+            alias, separator, omx_path = entry.partition('=')
+            if not separator:
+                omx_path, alias = entry, os.path.splitext(os.path.basename(entry))[0]
+            omx_files[alias] = omx_path
+        orig, dest = _read_od_pairs(args.pairs_file)
+        try:
+            with SkimLookup(omx_files, cache_mb=args.cache_mb) as lookup:
+                results = lookup.lookup(orig, dest, args.matrices)
+        except (ValueError, KeyError) as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+        if args.output:
+            results.to_csv(args.output, index=False)
+            print(f"{len(results):,} OD pairs written to {args.output} in {time.time() - start_time:.2f} seconds.")
+        else:
+            print(results.to_string(index=False))
+        return
+
+    builder = SkimFileBuilder(args.config, max_workers=args.workers)
+    builder.process_skims()
+    builder.save_output()
+    builder.verify_output()
+    print("\nProcess finished successfully!")
+
+
+if __name__ == '__main__':
+    main()
 
 
 # #### Code V3